@@ -0,0 +1,309 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import monotonic
+from typing import Awaitable, Callable
+
+from changes import Backoff, ChangeDetector
+from core import Core
+
+
+class AsyncCore:
+    """
+    An asyncio interface to `Core`, so one process can watch several outcome conditions at the same time.
+
+    Waits do not hold a thread for their whole timeout: every poll runs the capture and the matching in a
+    thread pool and the wait sleeps with `asyncio.sleep` between polls. Mouse and keyboard actions go through
+    a single-thread executor, which queues them and runs them one at a time in the order they were requested,
+    so concurrent tasks never interleave clicks and keystrokes. Image searches and waits never run on that
+    queue, so a slow search does not hold up the actions of other tasks.
+
+    Attributes:
+        core (Core): The core that captures, matches and acts.
+
+    Example:
+        >>> async def login(robot: AsyncCore):
+        ...     await robot.execute_image_based_write(images, ("user", "password", None))
+        ...     index, result = await robot.first_of(
+        ...         robot.wait_for_image("continue"),
+        ...         robot.wait_for_image("evadeerror"),
+        ...         robot.wait_for_window("Login"),
+        ...         timeout=60,
+        ...     )
+    """
+
+    def __init__(self, core: Core | None = None, max_workers: int = 4):
+        self.core = core if core is not None else Core()
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="core-match")
+        self._actions = ThreadPoolExecutor(max_workers=1, thread_name_prefix="core-input")
+
+    async def __aenter__(self) -> "AsyncCore":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shuts the executors down without waiting for the running jobs.
+        """
+        self._workers.shutdown(wait=False, cancel_futures=True)
+        self._actions.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, function: Callable, *args, **kwargs):
+        """
+        Runs a blocking function in the worker pool and returns its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._workers, partial(function, *args, **kwargs))
+
+    async def act(self, function: Callable, *args, **kwargs):
+        """
+        Queues a blocking mouse or keyboard action and returns its result once it ran.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._actions, partial(function, *args, **kwargs))
+
+    async def locate_many(self, *dict_keys: str, **kwargs) -> dict:
+        """
+        Awaitable version of `Core.locate_many`.
+        """
+        return await self.run(self.core.locate_many, *dict_keys, **kwargs)
+
+    async def wait_for_any(
+        self,
+        *keys: str,
+        timeout: float = 200,
+        poll_interval: float = 2,
+        min_poll_interval: float = 0.1,
+        click: bool = False
+    ) -> tuple[str, tuple[int, int]]:
+        """
+        Waits until any of the specified images appears on the screen.
+
+        The polls follow `Core.wait_until_any_is_on_screen`: frames that did not change are not matched and the
+        interval between polls grows from `min_poll_interval` to `poll_interval` while the screen is idle.
+
+        Args:
+            *keys (str): The keys used to look up the images in the image dictionary.
+            timeout (float, optional): The maximum amount of time (in seconds) to wait. Defaults to 200 seconds.
+            poll_interval (float, optional): The longest interval (in seconds) between polls. Defaults to 2 seconds.
+            min_poll_interval (float, optional): The interval (in seconds) right after the screen changes. Defaults to 0.1 seconds.
+            click (bool, optional): Whether to click the image once found, through the action queue. Defaults to False.
+
+        Returns:
+            tuple[str, tuple[int, int]]: The key of the first image found and its (x, y) center.
+
+        Raises:
+            TimeoutError: If none of the images appears within `timeout` seconds.
+        """
+        detector = ChangeDetector()
+        backoff = Backoff(min_poll_interval, poll_interval)
+        end_time = monotonic() + timeout
+        while True:
+            found = await self.run(self.core.poll_for_images, detector, *keys)
+            if found is not None:
+                for key, point in found.items():
+                    if point is not None:
+                        if click:
+                            await self.act(self.core.click_at, point)
+                        return key, point
+                interval = backoff.reset()
+            else:
+                interval = backoff.grow()
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"None of the images {', '.join(map(str, keys))} appeared within {timeout} seconds.")
+            await asyncio.sleep(min(interval, remaining))
+
+    async def wait_for_image(self, key: str, **kwargs) -> tuple[int, int]:
+        """
+        Waits until an image appears on the screen and returns its (x, y) center. See `wait_for_any`.
+        """
+        _, point = await self.wait_for_any(key, **kwargs)
+        return point
+
+    async def wait_for_window(
+        self,
+        title: str,
+        timeout: float = 20,
+        min_interval: float = 0.05,
+        max_interval: float = 0.5
+    ) -> str:
+        """
+        Waits until the window in the foreground has the given title.
+
+        Args:
+            title (str): The title to wait for.
+            timeout (float, optional): The maximum amount of time (in seconds) to wait. Defaults to 20 seconds.
+            min_interval (float, optional): The first interval (in seconds) between polls. Defaults to 0.05 seconds.
+            max_interval (float, optional): The longest interval (in seconds) between polls. Defaults to 0.5 seconds.
+
+        Returns:
+            str: The title of the window.
+
+        Raises:
+            TimeoutError: If the window does not become active within `timeout` seconds.
+        """
+        backoff = Backoff(min_interval, max_interval)
+        end_time = monotonic() + timeout
+        while True:
+            if await self.run(self.core.windows.active_title) == title:
+                return title
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"The window '{title}' did not become active within the timeout period of {timeout} seconds.")
+            await asyncio.sleep(min(backoff.grow(), remaining))
+
+    @staticmethod
+    async def first_of(*conditions: Awaitable, timeout: float | None = None) -> tuple[int, object]:
+        """
+        Races several waits and returns the first one to finish, cancelling the others.
+
+        A condition that fails is ignored while the others are still running, so an error dialog that never
+        shows up does not end the race, and neither does a condition cancelled from elsewhere. If every
+        condition fails, the first failure is raised.
+
+        Args:
+            *conditions (Awaitable): The waits to race, such as `wait_for_image(...)` or `wait_for_window(...)`.
+            timeout (float | None, optional): The maximum amount of time (in seconds) to wait. Defaults to None.
+
+        Returns:
+            tuple[int, object]: The position of the winning condition in `conditions` and its result.
+
+        Raises:
+            TimeoutError: If no condition finishes within `timeout` seconds.
+            ValueError: If no condition is given.
+        """
+        if not conditions:
+            raise ValueError("At least one condition is required.")
+        tasks = [asyncio.ensure_future(condition) for condition in conditions]
+        pending = set(tasks)
+        end_time = monotonic() + timeout if timeout is not None else None
+        failure = None
+        try:
+            while pending:
+                remaining = end_time - monotonic() if end_time is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No condition finished within {timeout} seconds.")
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    # `exception()` raises on a cancelled task instead of returning
+                    error = asyncio.CancelledError() if task.cancelled() else task.exception()
+                    if error is None:
+                        return tasks.index(task), task.result()
+                    if failure is None:
+                        failure = error
+            raise failure
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _search(self, load: Callable, key: str, min_search_time: float) -> tuple[int, int]:
+        """
+        Searches for an image in the worker pool and returns its (x, y) center.
+
+        Raises:
+            ValueError: If the image is not found within `min_search_time` seconds.
+        """
+        match = await self.run(lambda: self.core._search({key: load(key)}, min_search_time=min_search_time))
+        if match is None:
+            raise ValueError(f"Image '{key}' was not found on the screen")
+        return match[1]
+
+    async def _pause(self, delay: float, region=None) -> None:
+        """
+        Awaitable version of `Core._pause`, which sleeps without holding a thread when there is no `settler`.
+        """
+        if self.core.settler is None:
+            with self.core.tracer.span("sleep", delay=delay):
+                await asyncio.sleep(delay)
+        else:
+            await self.run(self.core._pause, delay, region)
+
+    async def find_img_and_click(
+        self,
+        dict_key: str,
+        difx: int = 0,
+        dify: int = 0,
+        delay: float = 0.2,
+        until: str | None = None
+    ) -> None:
+        """
+        Awaitable version of `Core.find_img_and_click`. The search runs in the worker pool and only the click is
+        queued.
+        """
+        point = await self._search(self.core.templates.template, dict_key, min_search_time=1)
+        await self.act(self.core.click_at, point, difx, dify, delay, until)
+
+    async def try_click_one_or_more(self, *dict_key_tuple: str) -> None:
+        """
+        Queued version of `Core.try_click_one_or_more`.
+        """
+        await self.act(self.core.try_click_one_or_more, *dict_key_tuple)
+
+    def _write_at(self, x: int, y: int, string: str | None) -> None:
+        self.core._input("move_to", x, y)
+        self.core._input("double_click")
+        if string:
+            self.core.type_text(string)
+
+    async def execute_image_based_write(self, auth_img_array, auth_str_array, diff=((0, 0), (0, 0), (0, 0))) -> None:
+        """
+        Awaitable version of `Core.execute_image_based_write`.
+
+        The pause and the search before each field run off the action queue; the click and the typing of each
+        field are queued as a single action, so no other task can type into the field in between.
+
+        Raises:
+            ValueError: If the lengths of `auth_img_array` and `auth_str_array` do not match, or if an image
+                        cannot be located on the screen.
+        """
+        if len(auth_img_array) != len(auth_str_array):
+            raise ValueError("Length of image array must match length of string array.")
+
+        for difference, img, string in zip(diff, auth_img_array, auth_str_array):
+            await self._pause(0.5, self.core.search_region)
+            x, y = await self._search(self.core.templates.template_from_file, img, min_search_time=2)
+            await self.act(self._write_at, x + difference[0], y + difference[1], string)
+
+    async def open_window(self, window_title: str) -> None:
+        """
+        Queued version of `Core.open_window`.
+        """
+        await self.act(self.core.open_window, window_title)
+
+    async def search_open_and_auth(
+        self,
+        window_title: str,
+        has_login: bool = False,
+        login_page: str = "",
+        user: str = "",
+        password: str = "",
+        diff: tuple[tuple[int, int], tuple[int, int], tuple[int, int]] = ((0, 0), (0, 0), (0, 0)),
+        auth_image_path_array: list[str] | tuple[str, str, str] = ("", "", ""),
+    ) -> None:
+        """
+        Awaitable version of `Core.search_open_and_auth`.
+
+        Focusing the window and opening the software are queued actions, while the wait for the login page
+        uses `wait_for_window`, so it does not hold the action queue or a thread.
+
+        Raises:
+            ValueError: If the window cannot be found and the software cannot be opened.
+            TimeoutError: If the login page does not become active within 20 seconds.
+        """
+        auth_str_array = (user, password, None)
+        try:
+            await self.open_window(window_title)
+        except ValueError as open_window_error:
+            try:
+                await self.act(lambda: self.core.open_software(self.core.programdir))
+            except Exception as e:
+                raise ValueError(f"Cannot find window: '{open_window_error}' and cannot open software: '{e}'")
+            if login_page:
+                await self.wait_for_window(login_page)
+                if has_login:
+                    await self.execute_image_based_write(auth_image_path_array, auth_str_array, diff)
+            else:
+                await self.act(self.core.alert_window, "Window not found and directory not provided", "Error")
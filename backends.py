@@ -0,0 +1,420 @@
+from ctypes import Structure, Union, c_long, c_size_t, c_ulong, c_ushort
+from os import system
+from time import monotonic, sleep
+from typing import Callable, Iterable, Sequence
+
+import numpy as np
+
+from capture import ScreenSource, SyntheticSource, display_scale
+from windows import FakeWindowProvider, Win32WindowProvider, WindowInfo
+
+
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+CF_UNICODETEXT = 13
+GMEM_MOVEABLE = 0x0002
+# CF_TEXT, CF_OEMTEXT, CF_UNICODETEXT and CF_LOCALE: the formats Windows derives from the text itself
+TEXT_FORMATS = {1, 7, 13, 16}
+# Registered clipboard formats that keep the pasted text out of clipboard monitors, history and sync
+PRIVATE_FORMATS = {
+    "ExcludeClipboardContentFromMonitorProcessing": 0,
+    "CanIncludeInClipboardHistory": 0,
+    "CanUploadToCloudClipboard": 0,
+}
+# Control characters are sent as the keys they stand for, since a unicode event does not press them
+VIRTUAL_KEYS = {"\n": 0x0D, "\r": 0x0D, "\t": 0x09, "\b": 0x08}
+
+
+class _MouseInput(Structure):
+    _fields_ = [("dx", c_long), ("dy", c_long), ("mouseData", c_ulong), ("dwFlags", c_ulong),
+                ("time", c_ulong), ("dwExtraInfo", c_size_t)]
+
+
+class _KeyboardInput(Structure):
+    _fields_ = [("wVk", c_ushort), ("wScan", c_ushort), ("dwFlags", c_ulong), ("time", c_ulong),
+                ("dwExtraInfo", c_size_t)]
+
+
+class _InputUnion(Union):
+    # The mouse member makes the union as large as the one SendInput expects
+    _fields_ = [("mi", _MouseInput), ("ki", _KeyboardInput)]
+
+
+class _Input(Structure):
+    _fields_ = [("type", c_ulong), ("union", _InputUnion)]
+
+
+def _key_events(text: str) -> list[_Input]:
+    events = []
+    # Characters outside the basic plane are sent as their two UTF-16 halves
+    units = text.encode("utf-16-le")
+    for index in range(0, len(units), 2):
+        code = int.from_bytes(units[index:index + 2], "little")
+        virtual_key = VIRTUAL_KEYS.get(chr(code))
+        for up in (0, KEYEVENTF_KEYUP):
+            event = _Input(type=INPUT_KEYBOARD)
+            if virtual_key is not None:
+                event.union.ki = _KeyboardInput(wVk=virtual_key, dwFlags=up)
+            else:
+                event.union.ki = _KeyboardInput(wScan=code, dwFlags=KEYEVENTF_UNICODE | up)
+            events.append(event)
+    return events
+
+
+class PyAutoGUIInput:
+    """
+    Moves the mouse and types with `pyautogui` and the win32 API.
+
+    Input backends expose `move_to(x, y)`, `double_click()` and three ways to enter text: `type_text(text)`
+    presses one key at a time, `send_text(text)` injects the whole text in a single batch of events and
+    `paste_text(text)` pastes it through the clipboard. The last two raise `NotImplementedError` when the
+    backend cannot do them and `OSError` when the system refused them before anything was typed.
+    `pyautogui` is imported on the first action, since importing it needs a display.
+
+    Attributes:
+        restore_delay (float): How long (in seconds) the pasted text stays on the clipboard before the previous
+                               contents are put back, so the target application has time to read it.
+    """
+
+    def __init__(self, restore_delay: float = 0.1):
+        self.restore_delay = restore_delay
+
+    def move_to(self, x: int, y: int) -> None:
+        from pyautogui import moveTo
+
+        moveTo(x, y)
+
+    def double_click(self) -> None:
+        from pyautogui import doubleClick
+
+        doubleClick()
+
+    def type_text(self, text: str) -> None:
+        from pyautogui import typewrite
+
+        typewrite(text)
+
+    def send_text(self, text: str) -> None:
+        from ctypes import sizeof, windll
+
+        events = _key_events(text)
+        if not events:
+            return
+        sent = windll.user32.SendInput(len(events), (_Input * len(events))(*events), sizeof(_Input))
+        if sent == 0:
+            raise OSError("The system did not accept the input batch")
+        if sent < len(events):
+            raise RuntimeError(f"Only {sent} of {len(events)} key events were injected")
+
+    @staticmethod
+    def _open_clipboard() -> None:
+        from ctypes import windll
+
+        # Another process may hold the clipboard for a moment
+        for _ in range(10):
+            if windll.user32.OpenClipboard(None):
+                return
+            sleep(0.01)
+        raise OSError("Cannot open the clipboard")
+
+    @staticmethod
+    def _clipboard_text() -> str | None:
+        from ctypes import c_void_p, windll, wstring_at
+
+        windll.user32.GetClipboardData.restype = c_void_p
+        windll.kernel32.GlobalLock.argtypes = [c_void_p]
+        windll.kernel32.GlobalLock.restype = c_void_p
+        windll.kernel32.GlobalUnlock.argtypes = [c_void_p]
+        handle = windll.user32.GetClipboardData(CF_UNICODETEXT)
+        if not handle:
+            return None
+        pointer = windll.kernel32.GlobalLock(handle)
+        try:
+            return wstring_at(pointer)
+        finally:
+            windll.kernel32.GlobalUnlock(handle)
+
+    @staticmethod
+    def _clipboard_has_other_data() -> bool:
+        from ctypes import windll
+
+        format_id = windll.user32.EnumClipboardFormats(0)
+        while format_id:
+            if format_id not in TEXT_FORMATS:
+                return True
+            format_id = windll.user32.EnumClipboardFormats(format_id)
+        return False
+
+    @staticmethod
+    def _set_clipboard_data(format_id: int, data) -> None:
+        from ctypes import c_uint, c_void_p, memmove, sizeof, windll
+
+        windll.kernel32.GlobalAlloc.argtypes = [c_uint, c_size_t]
+        windll.kernel32.GlobalAlloc.restype = c_void_p
+        windll.kernel32.GlobalLock.argtypes = [c_void_p]
+        windll.kernel32.GlobalLock.restype = c_void_p
+        windll.kernel32.GlobalUnlock.argtypes = [c_void_p]
+        windll.kernel32.GlobalFree.argtypes = [c_void_p]
+        windll.user32.SetClipboardData.argtypes = [c_uint, c_void_p]
+        windll.user32.SetClipboardData.restype = c_void_p
+        handle = windll.kernel32.GlobalAlloc(GMEM_MOVEABLE, sizeof(data))
+        if not handle:
+            raise OSError("Cannot allocate the clipboard data")
+        memmove(windll.kernel32.GlobalLock(handle), data, sizeof(data))
+        windll.kernel32.GlobalUnlock(handle)
+        if not windll.user32.SetClipboardData(format_id, handle):
+            # The clipboard only owns the memory once the call succeeds
+            windll.kernel32.GlobalFree(handle)
+            raise OSError("Cannot set the clipboard data")
+
+    @classmethod
+    def _set_clipboard_text(cls, text: str | None, private: bool = False) -> None:
+        from ctypes import c_uint32, create_unicode_buffer, windll
+
+        windll.user32.EmptyClipboard()
+        if text is None:
+            return
+        if private:
+            # Keeps credentials out of clipboard managers, the clipboard history and the cloud clipboard
+            for name, value in PRIVATE_FORMATS.items():
+                format_id = windll.user32.RegisterClipboardFormatW(name)
+                if not format_id:
+                    raise OSError(f"Cannot register the clipboard format {name}")
+                cls._set_clipboard_data(format_id, c_uint32(value))
+        cls._set_clipboard_data(CF_UNICODETEXT, create_unicode_buffer(text))
+
+    def paste_text(self, text: str) -> None:
+        """
+        Pastes `text` with Ctrl+V and then puts back the text that was on the clipboard.
+
+        The pasted text is marked so that Windows leaves it out of the clipboard history and the cloud
+        clipboard. Only text can be put back, so when the clipboard holds anything else, such as an image or
+        files, nothing is pasted and `OSError` is raised for the caller to type the text another way.
+
+        Raises:
+            OSError: If the clipboard cannot be used, before anything was pasted.
+            RuntimeError: If the text was pasted but the previous clipboard text could not be put back. The
+                          text must not be typed again.
+        """
+        from ctypes import windll
+        from pyautogui import hotkey
+
+        self._open_clipboard()
+        try:
+            if self._clipboard_has_other_data():
+                raise OSError("The clipboard holds data that is not text and cannot be restored after pasting")
+            previous = self._clipboard_text()
+            try:
+                self._set_clipboard_text(text, private=True)
+            except OSError:
+                self._set_clipboard_text(previous)
+                raise
+        finally:
+            windll.user32.CloseClipboard()
+        try:
+            hotkey("ctrl", "v")
+            sleep(self.restore_delay)
+        finally:
+            try:
+                self._open_clipboard()
+                try:
+                    self._set_clipboard_text(previous)
+                finally:
+                    windll.user32.CloseClipboard()
+            except OSError as error:
+                # Ctrl+V was already sent, so this must not read as a refusal that falls back to typing
+                raise RuntimeError("The text was pasted but the clipboard could not be put back") from error
+
+
+class RecordedInput:
+    """
+    An input backend that records the actions instead of performing them.
+
+    Args:
+        unsupported (Iterable[str], optional): The text entry methods, "send_text" or "paste_text", that raise
+                                               `NotImplementedError`, to exercise the fallback to `type_text`.
+                                               Defaults to ().
+
+    Attributes:
+        events (list[tuple]): The actions in order, as ("move", x, y), ("double_click", x, y), ("type", text),
+                              ("send", text) and ("paste", text), each followed by the `time.monotonic` time
+                              it was requested at.
+        position (tuple[int, int]): The position of the simulated cursor.
+        clipboard (str | None): The text on the simulated clipboard, put back after every paste.
+    """
+
+    def __init__(self, unsupported: Iterable[str] = ()):
+        self.events = []
+        self.position = (0, 0)
+        self.clipboard = None
+        self.unsupported = set(unsupported)
+
+    def move_to(self, x: int, y: int) -> None:
+        self.position = (x, y)
+        self.events.append(("move", x, y, monotonic()))
+
+    def double_click(self) -> None:
+        self.events.append(("double_click", *self.position, monotonic()))
+
+    def type_text(self, text: str) -> None:
+        self.events.append(("type", text, monotonic()))
+
+    def send_text(self, text: str) -> None:
+        if "send_text" in self.unsupported:
+            raise NotImplementedError("send_text")
+        self.events.append(("send", text, monotonic()))
+
+    def paste_text(self, text: str) -> None:
+        if "paste_text" in self.unsupported:
+            raise NotImplementedError("paste_text")
+        previous, self.clipboard = self.clipboard, text
+        self.events.append(("paste", self.clipboard, monotonic()))
+        self.clipboard = previous
+
+    def typed(self) -> str:
+        """
+        Returns all the text entered so far, whatever the method used.
+        """
+        return "".join(event[1] for event in self.events if event[0] in ("type", "send", "paste"))
+
+    def clear(self) -> None:
+        self.events.clear()
+
+
+class MessageBoxAlerts:
+    """
+    Shows alerts in a win32 message box.
+
+    Alert backends expose `show(message, title)`, which blocks until the alert is dismissed.
+    """
+
+    def show(self, message: str, title: str) -> None:
+        from ctypes import windll
+
+        windll.user32.MessageBoxW(0, message, title, 0)
+
+
+class RecordedAlerts:
+    """
+    An alert backend that records the alerts instead of showing them.
+
+    Attributes:
+        alerts (list[tuple[str, str]]): The (message, title) of every alert, in order.
+    """
+
+    def __init__(self):
+        self.alerts = []
+
+    def show(self, message: str, title: str) -> None:
+        self.alerts.append((message, title))
+
+
+class Win32Backend:
+    """
+    The desktop backend: screenshots and input through `pyautogui`, windows through `pywinauto` and alerts
+    through the win32 API.
+
+    Backends group a frame source (`screen`), an input backend (`input`), a window provider (`windows`) and an
+    alert backend (`alerts`), along with `display_scale()` and `open_program(path)`. None of the desktop
+    libraries is imported until the first screenshot, action or window lookup, so creating the backend is cheap
+    and works on any platform.
+    """
+
+    name = "win32"
+
+    def __init__(self):
+        self.screen = ScreenSource()
+        self.input = PyAutoGUIInput()
+        self.windows = Win32WindowProvider()
+        self.alerts = MessageBoxAlerts()
+
+    def display_scale(self) -> float:
+        """
+        Returns the scale factor of the primary display.
+
+        A process that is not DPI aware is always told the display runs at 96 DPI. `pyautogui` makes the process
+        DPI aware when it is imported, which now only happens on the first screenshot or action, so the process
+        is made DPI aware here first, the same way.
+        """
+        try:
+            from ctypes import windll
+
+            windll.user32.SetProcessDPIAware()
+        except (ImportError, AttributeError, OSError):
+            pass
+        return display_scale()
+
+    def open_program(self, path: str) -> None:
+        system(f"start \"{path}\"")
+
+
+class HeadlessBackend:
+    """
+    An in-process backend with no desktop, for validating workflows and benchmarking on any platform.
+
+    The screen plays back synthetic frames, the input and the alerts are recorded, and the windows come from a
+    `FakeWindowProvider` that workflows can open, close and focus.
+
+    Args:
+        frames (Sequence[numpy.ndarray] | Callable[[int], numpy.ndarray] | None, optional): The frames to play
+            back, as taken by `SyntheticSource`. Defaults to None, which shows a black screen of `size`.
+        windows (Iterable[WindowInfo], optional): The windows that are open at the start. Defaults to ().
+        active (int | None, optional): The handle of the window in the foreground. Defaults to None.
+        scale (float, optional): The display scale factor to report. Defaults to 1.0.
+        size (tuple[int, int], optional): The (width, height) of the default black screen. Defaults to 1920x1080.
+
+    Attributes:
+        launched (list[str]): The programs passed to `open_program`, in order.
+
+    Example:
+        >>> backend = HeadlessBackend(frames=[screen], windows=[WindowInfo(1, "Login")], active=1)
+        >>> core = Core(backend=backend)
+        >>> core.find_img_and_click("login")
+        >>> backend.input.events[-1][0]
+        'double_click'
+    """
+
+    name = "headless"
+
+    def __init__(
+        self,
+        frames: Sequence[np.ndarray] | Callable[[int], np.ndarray] | None = None,
+        windows: Iterable[WindowInfo] = (),
+        active: int | None = None,
+        scale: float = 1.0,
+        size: tuple[int, int] = (1920, 1080)
+    ):
+        if frames is None:
+            frames = [np.zeros((size[1], size[0], 3), dtype=np.uint8)]
+        self.screen = SyntheticSource(frames)
+        self.input = RecordedInput()
+        self.windows = FakeWindowProvider(windows, active)
+        self.alerts = RecordedAlerts()
+        self.scale = scale
+        self.launched = []
+
+    def display_scale(self) -> float:
+        return self.scale
+
+    def open_program(self, path: str) -> None:
+        self.launched.append(path)
+
+
+BACKENDS = {"win32": Win32Backend, "headless": HeadlessBackend}
+
+
+def load_backend(backend=None):
+    """
+    Returns a backend instance from a name in `BACKENDS`, an existing instance, or None for the desktop backend.
+
+    Raises:
+        ValueError: If the name is not a known backend.
+    """
+    if backend is None:
+        backend = "win32"
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
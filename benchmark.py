@@ -0,0 +1,469 @@
+import json
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter, process_time
+
+import cv2
+import numpy as np
+
+from backends import HeadlessBackend
+from core import Core
+from matching import ENGINES, Pyramid, best_match, locate_in_areas
+from pool import MatcherPool
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    Draws a BGR frame that looks roughly like a desktop: flat panels, buttons with borders and lines of text.
+
+    Args:
+        width (int): The width of the frame in pixels.
+        height (int): The height of the frame in pixels.
+        seed (int, optional): The seed of the random generator, so the same frame can be drawn again. Defaults to 0.
+
+    Returns:
+        numpy.ndarray: The generated frame.
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 240, dtype=np.uint8)
+    for _ in range(max(width * height // 40000, 8)):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(40, 400)), int(rng.integers(20, 200))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (40, 40, 40), 1)
+    for _ in range(max(width * height // 20000, 16)):
+        x, y = int(rng.integers(0, width)), int(rng.integers(10, height))
+        text = "".join(chr(int(c)) for c in rng.integers(65, 91, int(rng.integers(3, 12))))
+        color = tuple(int(c) for c in rng.integers(0, 120, 3))
+        cv2.putText(frame, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, float(rng.uniform(0.4, 0.9)), color, 1)
+    return frame
+
+
+def cut_template(
+    frame: np.ndarray,
+    width: int,
+    height: int,
+    seed: int = 0,
+    absent_from: np.ndarray | None = None,
+    min_std: float = 20.0,
+    confidence: float = 0.9,
+    attempts: int = 200
+) -> tuple[np.ndarray, tuple[int, int]]:
+    """
+    Copies a random patch of a frame to be used as a template, found only where it was copied from.
+
+    Most of a synthetic frame is flat panels, and a flat patch scores 1.0 on every other flat area of the same
+    color. Patches whose pixels vary less than `min_std`, whose best match in `frame` is not the position they
+    were copied from, or that match `absent_from` at `confidence`, are drawn again.
+
+    Args:
+        frame (numpy.ndarray): The frame to copy from.
+        width (int): The width of the template.
+        height (int): The height of the template.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+        absent_from (numpy.ndarray | None, optional): A frame the template must not be found in, for templates
+                                                      used as misses. Defaults to None.
+        min_std (float, optional): The smallest standard deviation of the pixels of the template. Defaults to 20.
+        confidence (float, optional): The score at which the template counts as found in `absent_from`.
+                                      Defaults to 0.9.
+        attempts (int, optional): The number of patches drawn before giving up. Defaults to 200.
+
+    Returns:
+        tuple[numpy.ndarray, tuple[int, int]]: The template and the (left, top) position it was copied from.
+
+    Raises:
+        ValueError: If no patch drawn in `attempts` tries meets the conditions.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(attempts):
+        left = int(rng.integers(0, frame.shape[1] - width))
+        top = int(rng.integers(0, frame.shape[0] - height))
+        template = frame[top:top + height, left:left + width]
+        if template.std() < min_std or best_match(frame, template)[1] != (left, top):
+            continue
+        if absent_from is not None and best_match(absent_from, template)[0] >= confidence:
+            continue
+        return template.copy(), (left, top)
+    raise ValueError(f"No distinctive {width}x{height} patch found in {attempts} attempts")
+
+
+def near_miss(template: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Returns a copy of a template with a shifted color and a patch of noise, so it scores just below a match.
+    """
+    rng = np.random.default_rng(seed)
+    changed = template.astype(np.int16) + 40
+    height, width = template.shape[:2]
+    noise = rng.integers(-80, 80, (height // 2, width // 2) + template.shape[2:], dtype=np.int16)
+    changed[:height // 2, :width // 2] += noise
+    return np.clip(changed, 0, 255).astype(np.uint8)
+
+
+def time_call(function, *args, repeat: int = 5, **kwargs) -> tuple[float, object]:
+    """
+    Runs a function `repeat` times and returns the median duration in seconds with the last result.
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function(*args, **kwargs)
+        durations.append(perf_counter() - start)
+    return float(np.median(durations)), result
+
+
+def compare_engines(
+    sizes: tuple = ((1920, 1080), (3840, 2160)),
+    template_sizes: tuple = ((32, 24), (96, 32), (200, 120)),
+    cases: int = 5,
+    confidence: float = 0.9,
+    repeat: int = 3
+) -> list[dict]:
+    """
+    Compares every matching engine against the exhaustive engine on synthetic frames.
+
+    Each case draws a frame and runs a hit (a patch cut from the frame), a near miss (the same patch altered)
+    and a miss (a patch cut from another frame). A case agrees when the engine returns the same box as the
+    exhaustive search.
+
+    Args:
+        sizes (tuple, optional): The (width, height) of the frames to test.
+        template_sizes (tuple, optional): The (width, height) of the templates to test.
+        cases (int, optional): The number of frames drawn per combination. Defaults to 5.
+        confidence (float, optional): The confidence passed to the engines. Defaults to 0.9.
+        repeat (int, optional): The number of timed runs per lookup. Defaults to 3.
+
+    Returns:
+        list[dict]: One row per engine, frame size, template size and case kind, with the agreement rate and
+                    the median latency in milliseconds.
+    """
+    rows = []
+    for width, height in sizes:
+        for template_width, template_height in template_sizes:
+            results = {}
+            for case in range(cases):
+                frame = synthetic_frame(width, height, seed=case)
+                other = synthetic_frame(width, height, seed=case + 1000)
+                hit, _ = cut_template(frame, template_width, template_height, seed=case)
+                needles = {
+                    "hit": hit,
+                    "near miss": near_miss(hit, seed=case),
+                    "miss": cut_template(other, template_width, template_height, seed=case, absent_from=frame)[0],
+                }
+                for kind, needle in needles.items():
+                    # Templates keep their pyramid in the cache, while frames are downscaled on every capture
+                    needle = Pyramid(needle)
+                    expected = None
+                    for name, engine in ENGINES.items():
+                        elapsed, (box, _) = time_call(
+                            lambda: engine(Pyramid(frame), needle, confidence), repeat=repeat
+                        )
+                        if name == "exhaustive":
+                            expected = box
+                        row = results.setdefault((name, kind), {"agree": 0, "latencies": []})
+                        row["agree"] += box == expected
+                        row["latencies"].append(elapsed)
+            for (name, kind), row in results.items():
+                rows.append({
+                    "engine": name,
+                    "frame": f"{width}x{height}",
+                    "template": f"{template_width}x{template_height}",
+                    "case": kind,
+                    "agreement": row["agree"] / cases,
+                    "median_ms": float(np.median(row["latencies"])) * 1000,
+                })
+    return rows
+
+
+def pool_scaling(
+    size: tuple[int, int] = (3840, 2160),
+    workers: tuple = (1, 2, 4, 8),
+    template_counts: tuple = (1, 4, 16),
+    backends: tuple = ("thread", "process"),
+    confidence: float = 0.9,
+    repeat: int = 3
+) -> list[dict]:
+    """
+    Measures how matching several templates scales with the number of workers of a `MatcherPool`.
+
+    Half of the templates are cut from the frame and half from another frame, so hits and misses are mixed.
+    Every pooled result is compared with the serial result.
+
+    Args:
+        size (tuple[int, int], optional): The (width, height) of the frame. Defaults to 4K.
+        workers (tuple, optional): The worker counts to test.
+        template_counts (tuple, optional): The numbers of templates to test.
+        backends (tuple, optional): The pool backends to test.
+        confidence (float, optional): The confidence passed to the engine. Defaults to 0.9.
+        repeat (int, optional): The number of timed runs per configuration. Defaults to 3.
+
+    Returns:
+        list[dict]: One row per backend, worker count and template count, with the median latency in
+                    milliseconds, the speedup over serial matching and whether the results were identical.
+    """
+    width, height = size
+    frame = synthetic_frame(width, height, seed=0)
+    other = synthetic_frame(width, height, seed=1)
+    area = [(0, 0, width, height)]
+    rows = []
+    for count in template_counts:
+        needles = {
+            index: (
+                cut_template(frame, 64, 32, seed=index)[0] if index % 2 == 0
+                else cut_template(other, 64, 32, seed=index, absent_from=frame)[0],
+                area
+            )
+            for index in range(count)
+        }
+        serial_time, expected = time_call(
+            lambda: {name: locate_in_areas(frame, needle, areas, confidence) for name, (needle, areas) in needles.items()},
+            repeat=repeat
+        )
+        for backend in backends:
+            for worker_count in workers:
+                with MatcherPool(workers=worker_count, backend=backend) as pool:
+                    # The first call starts the workers, which is not part of the steady state
+                    pool.locate_all(frame, needles, confidence)
+                    elapsed, result = time_call(lambda: pool.locate_all(frame, needles, confidence), repeat=repeat)
+                rows.append({
+                    "backend": backend,
+                    "workers": worker_count,
+                    "templates": count,
+                    "median_ms": elapsed * 1000,
+                    "speedup": serial_time / elapsed if elapsed > 0 else 0.0,
+                    "identical": result == expected,
+                })
+    return rows
+
+
+class _BenchmarkCore(Core):
+    """
+    A `Core` whose fixed pauses around clicks are added up instead of slept, so the latencies measure the work
+    done by each method. Waits between polls are still slept, since they are part of how a wait behaves.
+    """
+
+    paused = 0.0
+
+    def _pause(self, delay: float, region=None, until=None) -> None:
+        self.paused += delay
+
+
+def _write_image(path: str, image: np.ndarray) -> None:
+    # Written the way TemplateCache.decode reads, so non-ASCII temporary paths work on Windows too
+    ok, data = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError(f"Cannot encode image '{path}'")
+    data.tofile(path)
+
+
+CORE_METHODS = ("find_img_and_click", "try_click_one_or_more", "execute_image_based_write", "wait_until_is_on_screen")
+
+
+def _core_calls(core: Core, keys: list[str], paths: list[str], wait_timeout: float) -> dict:
+    return {
+        "find_img_and_click": lambda: core.find_img_and_click(keys[0], delay=0),
+        "try_click_one_or_more": lambda: core.try_click_one_or_more(*keys),
+        "execute_image_based_write": lambda: core.execute_image_based_write(
+            [paths[i % len(paths)] for i in range(3)], ["user", "password", None]
+        ),
+        "wait_until_is_on_screen": lambda: core.wait_until_any_is_on_screen(
+            keys[0], timeout=wait_timeout, poll_interval=0.05, min_poll_interval=0.01
+        ),
+    }
+
+
+def core_hot_paths(
+    sizes: tuple = ((1920, 1080), (3840, 2160), (5760, 1080)),
+    template_counts: tuple = (1, 8),
+    cases: tuple = ("hit", "near miss", "miss"),
+    template_size: tuple[int, int] = (96, 32),
+    repeat: int = 5,
+    wait_timeout: float = 0.3,
+    match_engine: str = "exhaustive"
+) -> list[dict]:
+    """
+    Times the `Core` methods used by the robots on synthetic screens, through the headless backend.
+
+    For every screen size, number of templates and case, the templates are written to a temporary image folder
+    and the methods run against a still frame: in the "hit" case every template is cut from the frame, in the
+    "near miss" case every template is altered to score just below a match and in the "miss" case every template
+    is cut from another frame. 5760x1080 stands for three monitors side by side. The first call of every method
+    is not timed, since it decodes the templates. Methods that do not find their image raise or time out after
+    their usual minimum search time, which is part of what is measured.
+
+    Args:
+        sizes (tuple, optional): The (width, height) of the screens to test.
+        template_counts (tuple, optional): The numbers of templates per call to test.
+        cases (tuple, optional): The cases to test, among "hit", "near miss" and "miss".
+        template_size (tuple[int, int], optional): The (width, height) of the templates. Defaults to 96x32.
+        repeat (int, optional): The number of timed calls per method. Defaults to 5.
+        wait_timeout (float, optional): The timeout (in seconds) of `wait_until_is_on_screen`. Defaults to 0.3 seconds.
+        match_engine (str, optional): The engine the cores match with. Defaults to "exhaustive".
+
+    Returns:
+        list[dict]: One row per method, screen, template count and case, with the 50th, 90th and 99th percentile
+                    latencies in milliseconds, the captures and the CPU time (in milliseconds) per call, the
+                    pauses skipped per call and the share of calls that found their image (for
+                    `try_click_one_or_more`, the share of its images it clicked).
+    """
+    width, height = template_size
+    rows = []
+    for screen_width, screen_height in sizes:
+        frame = synthetic_frame(screen_width, screen_height, seed=0)
+        other = synthetic_frame(screen_width, screen_height, seed=1)
+        for count in template_counts:
+            for case in cases:
+                with TemporaryDirectory() as folder:
+                    makedirs(join(folder, "images"))
+                    png = {}
+                    for index in range(count):
+                        if case == "miss":
+                            template, _ = cut_template(other, width, height, seed=index, absent_from=frame)
+                        else:
+                            template, _ = cut_template(frame, width, height, seed=index)
+                        if case == "near miss":
+                            template = near_miss(template, seed=index)
+                        png[f"t{index}"] = f"t{index}.png"
+                        _write_image(join(folder, "images", png[f"t{index}"]), template)
+                    core_class = type("BenchmarkCore", (_BenchmarkCore,), {"folder_path": folder, "png": png})
+                    keys = list(png)
+                    paths = [core_class.find_image_path(key) for key in keys]
+                    for method in CORE_METHODS:
+                        backend = HeadlessBackend(frames=[frame])
+                        core = core_class(match_engine=match_engine, backend=backend)
+                        call = _core_calls(core, keys, paths, wait_timeout)[method]
+                        latencies, captures, cpu, found = [], 0, 0.0, 0
+                        for run in range(repeat + 1):
+                            core.paused = 0.0
+                            start_captures = backend.screen.count
+                            start_events = len(backend.input.events)
+                            start, start_cpu = perf_counter(), process_time()
+                            try:
+                                result = call()
+                                if method == "wait_until_is_on_screen":
+                                    ok = result is not None
+                                elif method == "try_click_one_or_more":
+                                    # It returns nothing and skips what it cannot find, so count its clicks
+                                    events = backend.input.events[start_events:]
+                                    ok = sum(event[0] == "double_click" for event in events) / len(keys)
+                                else:
+                                    ok = True
+                            except ValueError:
+                                ok = False
+                            elapsed, used = perf_counter() - start, process_time() - start_cpu
+                            if run == 0:
+                                continue
+                            latencies.append(elapsed)
+                            captures += backend.screen.count - start_captures
+                            cpu += used
+                            found += ok
+                        p50, p90, p99 = np.percentile(latencies, (50, 90, 99)) * 1000
+                        rows.append({
+                            "method": method,
+                            "screen": f"{screen_width}x{screen_height}",
+                            "templates": count,
+                            "case": case,
+                            "p50_ms": float(p50),
+                            "p90_ms": float(p90),
+                            "p99_ms": float(p99),
+                            "captures": captures / repeat,
+                            "cpu_ms": cpu / repeat * 1000,
+                            "paused_ms": core.paused * 1000,
+                            "found": found / repeat,
+                        })
+    return rows
+
+
+def _row_key(row: dict) -> tuple:
+    # Text and integer columns describe the configuration, float columns hold the measurements
+    return tuple(
+        (column, value) for column, value in row.items()
+        if isinstance(value, (str, int)) and not isinstance(value, bool)
+    )
+
+
+def save_baseline(rows: list[dict], path: str) -> None:
+    """
+    Writes benchmark rows to a JSON file, to be compared against by later runs.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(rows, file, indent=1)
+
+
+def compare_baseline(rows: list[dict], path: str, tolerance: float = 0.25, column: str = "p50_ms") -> list[dict]:
+    """
+    Compares benchmark rows with a baseline written by `save_baseline`.
+
+    Rows are matched on their text and count columns (method, screen, case, ...). A row regressed when its
+    `column` is more than `tolerance` above the baseline, or when it finds its image less often.
+
+    Args:
+        rows (list[dict]): The rows of the current run.
+        path (str): The baseline file.
+        tolerance (float, optional): The allowed relative slowdown. Defaults to 0.25, that is 25%.
+        column (str, optional): The latency column to compare. Defaults to "p50_ms".
+
+    Returns:
+        list[dict]: The rows with the baseline value and whether they regressed. Rows missing from the baseline
+                    never regress.
+    """
+    with open(path, encoding="utf-8") as file:
+        baseline = {_row_key(row): row for row in json.load(file)}
+    compared = []
+    for row in rows:
+        previous = baseline.get(_row_key(row))
+        regression = previous is not None and (
+            row[column] > previous[column] * (1 + tolerance) or row.get("found", 0) < previous.get("found", 0)
+        )
+        compared.append({
+            **row,
+            f"baseline_{column}": previous[column] if previous is not None else float("nan"),
+            "regression": regression,
+        })
+    return compared
+
+
+def print_rows(rows: list[dict]) -> None:
+    """
+    Prints benchmark rows as an aligned table.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[f"{row[column]:.3f}" if isinstance(row[column], float) else str(row[column]) for column in columns]
+             for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks template matching on synthetic frames.")
+    parser.add_argument("suite", nargs="?", default="engines", choices=("engines", "pool", "core"),
+                        help="engines: pyramid against exhaustive matching; pool: scaling of the matcher pool; "
+                             "core: latency of the Core methods on a headless screen")
+    parser.add_argument("--cases", type=int, default=5, help="frames drawn per combination")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per lookup")
+    parser.add_argument("--confidence", type=float, default=0.9)
+    parser.add_argument("--engine", default="exhaustive", choices=tuple(ENGINES), help="engine of the core suite")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare against")
+    parser.add_argument("--save-baseline", help="JSON file to write the rows of this run to")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline")
+    arguments = parser.parse_args()
+    if arguments.suite == "engines":
+        rows = compare_engines(cases=arguments.cases, confidence=arguments.confidence, repeat=arguments.repeat)
+    elif arguments.suite == "pool":
+        rows = pool_scaling(confidence=arguments.confidence, repeat=arguments.repeat)
+    else:
+        rows = core_hot_paths(repeat=arguments.repeat, match_engine=arguments.engine)
+    if arguments.save_baseline:
+        save_baseline(rows, arguments.save_baseline)
+    if arguments.baseline:
+        rows = compare_baseline(rows, arguments.baseline, arguments.tolerance)
+    print_rows(rows)
+    if any(row.get("regression") for row in rows):
+        raise SystemExit(1)
@@ -0,0 +1,205 @@
+import json
+from argparse import ArgumentParser
+from hashlib import sha256
+from os import stat
+from os.path import abspath, dirname, join
+from struct import Struct
+from typing import Hashable
+
+import numpy as np
+
+from matching import Pyramid, pyramid_level, to_gray
+from templates import Template, TemplateCache
+
+MAGIC = b"AWCB"
+VERSION = 1
+# Magic, format version and header length
+PREFIX = Struct("<4sIQ")
+# Every array starts on a multiple of this many bytes
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def build_bundle(png: dict, images_path: str, output: str) -> dict:
+    """
+    Compiles the image dictionary into a single bundle file of decoded templates.
+
+    Every file is decoded once and identical images are stored once, whatever their file name. For each image
+    the bundle holds the BGR and grayscale arrays and the pyramid levels used by the pyramid engine, along with
+    a SHA-256 of the decoded pixels. The file starts with a JSON header followed by the raw arrays, each aligned
+    to 64 bytes, so it can be memory-mapped and used without decoding or copying.
+
+    Args:
+        png (dict): The image dictionary, mapping keys to file names.
+        images_path (str): The directory the image files are in.
+        output (str): The path of the bundle file to write.
+
+    Returns:
+        dict: The number of keys, of unique templates and of data bytes written.
+    """
+    templates = {}
+    files = {}
+    keys = []
+    blobs = []
+    offset = 0
+
+    def add(array: np.ndarray) -> list:
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        offset = _align(offset)
+        blobs.append((offset, array))
+        entry = [offset, list(array.shape), array.dtype.str]
+        offset += array.nbytes
+        return entry
+
+    for key, file_name in png.items():
+        path = join(images_path, file_name)
+        color = TemplateCache.decode(path)
+        info = stat(path)
+        files[file_name] = [info.st_size, info.st_mtime_ns]
+        content_hash = sha256(color.tobytes() + str(color.shape).encode()).hexdigest()
+        keys.append([key, content_hash, file_name])
+        if content_hash in templates:
+            continue
+        gray = to_gray(color)
+        arrays = {"color": add(color), "gray": add(gray)}
+        levels = pyramid_level(color.shape)
+        color_pyramid, gray_pyramid = Pyramid(color), Pyramid(gray)
+        for level in range(1, levels + 1):
+            arrays[f"color/{level}"] = add(color_pyramid.level(level))
+            arrays[f"gray/{level}"] = add(gray_pyramid.level(level))
+        templates[content_hash] = {"file": file_name, "levels": levels, "arrays": arrays}
+
+    header = json.dumps({"keys": keys, "files": files, "templates": templates}).encode()
+    data_start = _align(PREFIX.size + len(header))
+    with open(output, "wb") as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for position, array in blobs:
+            file.seek(data_start + position)
+            file.write(array.tobytes())
+    return {"keys": len(keys), "templates": len(templates), "bytes": offset}
+
+
+class TemplateBundle:
+    """
+    A memory-mapped bundle of decoded templates written by `build_bundle`.
+
+    Opening a bundle only reads its header; the pixels are mapped from the file and paged in on first use.
+    The mapping is copy-on-write and never written to, so every robot process on the host shares the same
+    physical pages.
+
+    Attributes:
+        path (str): The bundle file.
+        keys (dict): The content hash of the template of each image key.
+        files (dict): The image file name of each image key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            magic, version, header_length = PREFIX.unpack(file.read(PREFIX.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"'{path}' is not a version {VERSION} template bundle")
+            header = json.loads(file.read(header_length))
+        self._data_start = _align(PREFIX.size + header_length)
+        self._map = np.memmap(path, dtype=np.uint8, mode="c")
+        self.keys = {key: content_hash for key, content_hash, _ in header["keys"]}
+        self.files = {key: file_name for key, _, file_name in header["keys"]}
+        self._files = header["files"]
+        self._templates = header["templates"]
+        self._loaded = {}
+
+    def __contains__(self, dict_key: Hashable) -> bool:
+        return dict_key in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _array(self, entry: list) -> np.ndarray:
+        offset, shape, dtype = entry
+        return np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=self._map, offset=self._data_start + offset)
+
+    def stale_files(self, images_path: str) -> list[str]:
+        """
+        Returns the image files that changed size or modification time, or were removed, since the bundle was built.
+        """
+        stale = []
+        for file_name, (size, mtime_ns) in self._files.items():
+            try:
+                info = stat(join(images_path, file_name))
+            except OSError:
+                stale.append(file_name)
+                continue
+            if (info.st_size, info.st_mtime_ns) != (size, mtime_ns):
+                stale.append(file_name)
+        return stale
+
+    def is_stale(self, images_path: str) -> bool:
+        """
+        Returns whether any image file changed size or modification time since the bundle was built.
+        """
+        return bool(self.stale_files(images_path))
+
+    def exclude(self, file_names: list[str]) -> list[Hashable]:
+        """
+        Drops the image keys of the given files, so their templates are read from the files again.
+
+        Args:
+            file_names (list[str]): The image files whose bundled templates are out of date.
+
+        Returns:
+            list[Hashable]: The image keys dropped from the bundle.
+        """
+        file_names = set(file_names)
+        excluded = [key for key, file_name in self.files.items() if file_name in file_names]
+        for key in excluded:
+            del self.keys[key]
+            del self.files[key]
+        return excluded
+
+    def content_hash(self, dict_key: Hashable) -> str:
+        """
+        Returns the SHA-256 of the decoded pixels of an image key.
+        """
+        return self.keys[dict_key]
+
+    def template(self, dict_key: Hashable) -> Template:
+        """
+        Returns the template of an image key, with its grayscale version and pyramid levels already attached.
+
+        Raises:
+            KeyError: If the key is not in the bundle.
+        """
+        content_hash = self.keys[dict_key]
+        template = self._loaded.get(content_hash)
+        if template is None:
+            entry = self._templates[content_hash]
+            arrays = entry["arrays"]
+            template = Template(f"{self.path}:{entry['file']}", self._array(arrays["color"]))
+            gray = self._array(arrays["gray"])
+            template.derived("gray", lambda _: gray)
+            for channel, grayscale in (("color", False), ("gray", True)):
+                levels = [self._array(arrays[f"{channel}/{level}"]) for level in range(1, entry["levels"] + 1)]
+                template.derived(("pyramid", grayscale), lambda _: Pyramid(template.image(grayscale), levels))
+            self._loaded[content_hash] = template
+        return template
+
+
+if __name__ == "__main__":
+    from files import png
+
+    folder_path = dirname(abspath(__file__))
+    parser = ArgumentParser(description="Compiles the images of files.png into a template bundle.")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("output", nargs="?", default=join(folder_path, "images.bundle"))
+    parser.add_argument("--images", default=join(folder_path, "images"), help="directory with the image files")
+    arguments = parser.parse_args()
+    if arguments.command == "build":
+        print(build_bundle(png, arguments.images, arguments.output))
+    else:
+        stale = TemplateBundle(arguments.output).stale_files(arguments.images)
+        print(f"stale: {', '.join(stale)}" if stale else "up to date")
@@ -0,0 +1,304 @@
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Callable, Iterator, Sequence
+
+import cv2
+import numpy as np
+
+
+def grab_frame(region: tuple[int, int, int, int] | None = None, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Takes a screenshot and returns it as a BGR array.
+
+    Args:
+        region (tuple[int, int, int, int] | None, optional): The (left, top, width, height) area to capture.
+                                                             Defaults to None, which captures the whole screen.
+        out (numpy.ndarray | None, optional): An array with the shape of the capture to write the frame into,
+                                              instead of allocating a new one. Defaults to None.
+
+    Returns:
+        numpy.ndarray: The captured frame in BGR order, matching the layout of the cached templates.
+    """
+    # Imported here so the capture service can run with other frame sources where there is no display
+    from pyautogui import screenshot
+
+    image = np.asarray(screenshot(region=region).convert("RGB"))
+    if out is not None and out.shape != image.shape:
+        out = None
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=out)
+
+
+class ScreenSource:
+    """
+    A frame source that captures the screen with `pyautogui`.
+
+    Frame sources have a single method, `grab(out)`, which returns a new BGR frame, writing it into `out` when
+    `out` is given and has the right shape.
+    """
+
+    def __init__(self, region: tuple[int, int, int, int] | None = None):
+        self.region = region
+
+    def grab(self, out: np.ndarray | None = None) -> np.ndarray:
+        return grab_frame(self.region, out)
+
+
+class SyntheticSource:
+    """
+    A frame source that plays back generated frames, for running the capture service without a display.
+
+    Args:
+        frames (Sequence[numpy.ndarray] | Callable[[int], numpy.ndarray]): The frames to return in a loop, or
+            a callable that receives the number of the capture and returns the frame.
+    """
+
+    def __init__(self, frames: Sequence[np.ndarray] | Callable[[int], np.ndarray]):
+        if not callable(frames) and not frames:
+            raise ValueError("At least one frame is required.")
+        self.frames = frames
+        self.count = 0
+
+    def grab(self, out: np.ndarray | None = None) -> np.ndarray:
+        if callable(self.frames):
+            frame = self.frames(self.count)
+        else:
+            frame = self.frames[self.count % len(self.frames)]
+        self.count += 1
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return out
+        return frame.copy()
+
+
+class Frame:
+    """
+    A frame held in the ring buffer of a `CaptureService`.
+
+    Attributes:
+        array (numpy.ndarray): The frame pixels. It is a view into the ring buffer, valid while the frame is held.
+        timestamp (float): The `time.monotonic()` value at which the capture finished.
+        sequence (int): The number of the capture, starting at 1.
+    """
+
+    __slots__ = ("array", "timestamp", "sequence", "slot")
+
+    def __init__(self, array: np.ndarray, timestamp: float, sequence: int, slot: int):
+        self.array = array
+        self.timestamp = timestamp
+        self.sequence = sequence
+        self.slot = slot
+
+    @property
+    def age(self) -> float:
+        return monotonic() - self.timestamp
+
+
+class CaptureService:
+    """
+    Captures frames on a background thread into a fixed-size ring buffer of reused arrays.
+
+    Each slot gets its array from the first capture written to it; later captures into that slot are written
+    into the same array, as long as the screen size does not change.
+
+    Readers get the newest frame without copying it. While a frame is held through `hold`, the capture thread
+    skips its slot, so the pixels cannot change under a running match. Several concurrent waits can share the
+    same captures instead of taking one screenshot each.
+
+    Attributes:
+        source: The frame source, an object with a `grab(out)` method such as `ScreenSource`.
+        size (int): The number of slots in the ring buffer.
+        interval (float): The minimum time (in seconds) between two captures, 0 to capture as fast as possible.
+        captures (int): The number of frames captured so far.
+        error (Exception | None): The last exception raised by the source, cleared by the next successful capture.
+
+    Example:
+        >>> with CaptureService(ScreenSource(), interval=1 / 30) as service:
+        ...     with service.hold(max_age=0.1) as frame:
+        ...         print(frame.array.shape, frame.age)
+    """
+
+    def __init__(self, source=None, size: int = 4, interval: float = 0.0):
+        if size < 2:
+            raise ValueError("The ring buffer needs at least two slots.")
+        self.source = source if source is not None else ScreenSource()
+        self.size = size
+        self.interval = interval
+        self.captures = 0
+        self.error = None
+        self._slots = [None] * size
+        self._pins = [0] * size
+        self._latest = None
+        self._timestamps = deque(maxlen=32)
+        self._condition = Condition()
+        self._running = False
+        self._thread = None
+
+    def __enter__(self) -> "CaptureService":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        """
+        Starts the capture thread. Does nothing if it is already running.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = Thread(target=self._run, name="capture-service", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5) -> None:
+        """
+        Stops the capture thread and waits for it to finish.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next_slot(self) -> int | None:
+        # The newest slot and the slots held by readers are never overwritten
+        start = self._latest.slot if self._latest is not None else -1
+        for offset in range(1, self.size + 1):
+            slot = (start + offset) % self.size
+            if self._pins[slot] == 0 and (self._latest is None or slot != self._latest.slot):
+                return slot
+        return None
+
+    def _run(self) -> None:
+        while self._running:
+            started = monotonic()
+            with self._condition:
+                slot = self._next_slot()
+            if slot is None:
+                sleep(0.001)
+                continue
+
+            try:
+                array = self.source.grab(self._slots[slot])
+            except Exception as e:
+                self.error = e
+                sleep(max(self.interval, 0.05))
+                continue
+
+            with self._condition:
+                self._slots[slot] = array
+                self.captures += 1
+                self._latest = Frame(array, monotonic(), self.captures, slot)
+                self._timestamps.append(self._latest.timestamp)
+                self.error = None
+                self._condition.notify_all()
+
+            remaining = self.interval - (monotonic() - started)
+            if remaining > 0:
+                sleep(remaining)
+
+    def latest(self) -> Frame | None:
+        """
+        Returns the newest frame without holding it, or None before the first capture.
+
+        The array may be overwritten once `size - 1` newer frames are captured, so use `hold` when the pixels
+        are read for longer than that.
+        """
+        return self._latest
+
+    def wait_newer(self, after: float, timeout: float = 5) -> Frame:
+        """
+        Waits for a frame captured after the given `time.monotonic()` value and returns it without holding it.
+
+        Raises:
+            TimeoutError: If no such frame is captured within `timeout` seconds.
+        """
+        with self._condition:
+            return self._wait_newer(after, timeout)
+
+    def _wait_newer(self, after: float, timeout: float) -> Frame:
+        end_time = monotonic() + timeout
+        while self._latest is None or self._latest.timestamp <= after:
+            remaining = end_time - monotonic()
+            if remaining <= 0 or not self._running:
+                reason = f": {self.error}" if self.error is not None else ""
+                raise TimeoutError(f"No new frame was captured within {timeout} seconds{reason}")
+            self._condition.wait(remaining)
+        return self._latest
+
+    @contextmanager
+    def hold(self, max_age: float = 0.1, timeout: float = 5) -> Iterator[Frame]:
+        """
+        Holds the newest frame that is at most `max_age` seconds old, waiting for a new capture if needed.
+
+        The capture thread does not overwrite the frame until the `with` block ends.
+
+        Args:
+            max_age (float, optional): The maximum age (in seconds) of the frame. Defaults to 0.1 seconds.
+            timeout (float, optional): How long to wait for a fresh frame. Defaults to 5 seconds.
+
+        Yields:
+            Frame: The held frame.
+
+        Raises:
+            TimeoutError: If no fresh frame is captured within `timeout` seconds.
+        """
+        with self._condition:
+            frame = self._wait_newer(monotonic() - max_age, timeout)
+            self._pins[frame.slot] += 1
+        try:
+            yield frame
+        finally:
+            with self._condition:
+                self._pins[frame.slot] -= 1
+
+    @property
+    def fps(self) -> float:
+        """
+        Returns the capture rate over the last 32 frames.
+        """
+        with self._condition:
+            if len(self._timestamps) < 2:
+                return 0.0
+            elapsed = self._timestamps[-1] - self._timestamps[0]
+            return (len(self._timestamps) - 1) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def frame_age(self) -> float | None:
+        """
+        Returns the age (in seconds) of the newest frame, or None before the first capture.
+        """
+        latest = self._latest
+        return latest.age if latest is not None else None
+
+    def stats(self) -> dict[str, float | int | None]:
+        """
+        Returns the capture counters.
+
+        Returns:
+            dict[str, float | int | None]: The number of captures, the capture rate and the age of the newest frame.
+        """
+        return {"captures": self.captures, "fps": self.fps, "frame_age": self.frame_age}
+
+
+def display_scale() -> float:
+    """
+    Returns the scale factor of the primary display, 1.0 at 100% and 1.5 at 150%.
+
+    The value comes from the DPI the system reports to a DPI-aware process. On platforms without the win32
+    API, or when the call fails, 1.0 is returned.
+    """
+    try:
+        from ctypes import windll
+
+        return windll.user32.GetDpiForSystem() / 96
+    except (ImportError, AttributeError, OSError):
+        return 1.0
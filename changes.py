@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+
+from regions import Region
+
+
+class ChangeDetector:
+    """
+    Finds the parts of the screen that changed between consecutive captures.
+
+    The frame is divided into square tiles and each capture is compared with a copy of the previous one, kept
+    in a buffer that is reused between captures. The changed tiles are grouped into rectangles, so a wait only
+    has to match templates where something was redrawn instead of over the whole screen.
+
+    Attributes:
+        tile_size (int): The side of the tiles in pixels.
+        frames (int): The number of frames compared.
+        unchanged (int): The number of frames identical to the previous one.
+    """
+
+    def __init__(self, tile_size: int = 64):
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive.")
+        self.tile_size = tile_size
+        self.frames = 0
+        self.unchanged = 0
+        self._previous = None
+
+    def reset(self) -> None:
+        """
+        Forgets the previous frame, so the next one is reported as entirely new.
+        """
+        self._previous = None
+
+    def tiles(self, frame: np.ndarray, previous: np.ndarray) -> np.ndarray:
+        """
+        Returns a boolean grid with one cell per tile, True where the two frames differ.
+
+        Args:
+            frame (numpy.ndarray): The current frame.
+            previous (numpy.ndarray): The previous frame, with the same shape.
+
+        Returns:
+            numpy.ndarray: The grid of changed tiles.
+        """
+        changed = frame != previous
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        height, width = changed.shape
+        size = self.tile_size
+        rows, columns = -(-height // size), -(-width // size)
+        padded = np.zeros((rows * size, columns * size), dtype=bool)
+        padded[:height, :width] = changed
+        return padded.reshape(rows, size, columns, size).any(axis=(1, 3))
+
+    def update(self, frame: np.ndarray) -> list[Region] | None:
+        """
+        Compares a frame with the previous one and keeps a copy of it for the next comparison.
+
+        Args:
+            frame (numpy.ndarray): The new frame.
+
+        Returns:
+            list[Region] | None: The (left, top, width, height) rectangles covering the changed tiles, an empty
+                                 list if nothing changed, or None if there is no comparable previous frame.
+        """
+        previous = self._previous
+        if previous is None or previous.shape != frame.shape:
+            self._previous = frame.copy()
+            return None
+        self.frames += 1
+        grid = self.tiles(frame, previous)
+        np.copyto(previous, frame)
+        if not grid.any():
+            self.unchanged += 1
+            return []
+        _, _, stats, _ = cv2.connectedComponentsWithStats(grid.astype(np.uint8), connectivity=8)
+        size = self.tile_size
+        # The first component is the background of unchanged tiles
+        return [
+            (int(left) * size, int(top) * size, int(width) * size, int(height) * size)
+            for left, top, width, height, _ in stats[1:]
+        ]
+
+
+class Backoff:
+    """
+    A polling interval that starts short and grows while nothing happens.
+
+    Attributes:
+        minimum (float): The interval (in seconds) used right after a change.
+        maximum (float): The longest interval (in seconds).
+        factor (float): How much the interval grows after each idle poll.
+    """
+
+    def __init__(self, minimum: float, maximum: float, factor: float = 2):
+        self.minimum = min(minimum, maximum)
+        self.maximum = maximum
+        self.factor = factor
+        self.interval = self.minimum
+
+    def reset(self) -> float:
+        """
+        Goes back to the shortest interval and returns it.
+        """
+        self.interval = self.minimum
+        return self.interval
+
+    def grow(self) -> float:
+        """
+        Returns the current interval and makes the next one longer, up to `maximum`.
+        """
+        interval = self.interval
+        self.interval = min(self.interval * self.factor, self.maximum)
+        return interval
@@ -1,13 +1,28 @@
-from ctypes import windll
-from os import system
+import warnings
+from contextlib import ExitStack, contextmanager
 from os.path import abspath, dirname, join
 from time import sleep, time
 
-from pyautogui import doubleClick, locateCenterOnScreen, moveTo, typewrite
-from pygetwindow import getActiveWindowTitle, getAllTitles
-from pywinauto import application, findwindows
-
+from backends import load_backend
+from bundle import TemplateBundle
+from capture import CaptureService
+from changes import Backoff, ChangeDetector
 from files import png
+from location_cache import LocationCache
+from pool import MatcherPool
+from matching import ENGINES, center, locate_in_areas, to_gray
+from regions import LocationHints, Region, clip, expand, intersect
+from scales import ScaleMemory
+from settle import Settler
+from templates import TemplateCache
+from tracing import NullTracer, Tracer
+from windows import WindowRegistry
+
+
+# The ways `Core.type_text` can enter text
+TEXT_ENTRY_MODES = ("keys", "batch", "paste")
+# The methods tried by `Core.type_text` for each mode before typing one key at a time
+TEXT_ENTRY_FALLBACKS = {"keys": (), "batch": ("batch",), "paste": ("paste", "batch")}
 
 
 class Core:
@@ -17,6 +32,29 @@ class Core:
     Attributes:
         folder_path (str): The directory path where the current script is located.
         png (dict): A dictionary containing image file names associated with their keys.
+        templates (TemplateCache): The in-memory cache of decoded template images, keyed by `png` keys, backed by
+                                   the template bundle when one is given.
+        match_engine (str): The name of the template matching engine, "exhaustive" or "pyramid".
+        capture (CaptureService | None): The background capture service frames are read from, or None to take a
+                                         screenshot on every search.
+        max_frame_age (float): The maximum age (in seconds) of a frame read from `capture`.
+        settler (Settler | None): Waits for the screen to stop changing between actions, or None to use the fixed delays.
+        matcher (MatcherPool | None): The pool several templates are matched in parallel with, or None to match them one by one.
+        location_cache (LocationCache | None): The persistent cache of match locations checked before any search, or None.
+        display_scale (float): The scale factor of the display, part of the geometry `location_cache` entries depend on.
+        search_region (Region | None): The (left, top, width, height) area searched before the full screen, set to
+                                       the client area of the window focused through `open_window`.
+        hints (LocationHints): The last location where each template was found, searched before anything else.
+        windows (WindowRegistry): The index of the open windows used to find, focus and wait for windows.
+        backend: The screen, input, window and alert backend, such as `backends.Win32Backend` or
+                 `backends.HeadlessBackend`.
+        scales (tuple[float, ...] | None): The display scale factors the templates are matched at, or None to
+                                           match the images as they are.
+        template_scale (float): The display scale the images were captured at.
+        scale_memory (ScaleMemory): The scale that last matched on this host, tried before the others.
+        text_entry (str): How text is typed, "keys", "batch" or "paste".
+        tracer (Tracer | NullTracer): Records spans for captures, matches, input, sleeps and waits, or nothing
+                                      when tracing is disabled.
 
     Methods:
         get_active_window_names():
@@ -55,47 +93,173 @@ class Core:
         find_image_path(dict_key: str) -> str:
             Finds the path to an image file in the current working directory based on a key from the image dictionary.
         
-        find_img_and_click(dict_key: str, difx: int = 0, dify: int = 0, delay: float = 0.2) -> None:
+        find_img_and_click(dict_key: str, difx: int = 0, dify: int = 0, delay: float = 0.2, until: str | None = None) -> None:
             Finds an image on the screen and performs a click at its location with optional offsets and delay.
         
+        click_at(point: tuple[int, int], difx: int = 0, dify: int = 0, delay: float = 0.2, until: str | None = None) -> None:
+            Moves the cursor to a point and double-clicks it with a pause before and after.
+        
+        locate_many(*dict_keys: str, confidence: float = 0.9, grayscale: bool = False, region: Region | None = None) -> dict:
+            Locates several images on a single screenshot and returns the center of each one, or None.
+        
+        type_text(text: str) -> None:
+            Types text into the focused field one key at a time, in a single batch or through the clipboard.
+        
         try_click_one_or_more(*dict_key_tuple: str) -> None:
             Attempts to find and click each specified image on the screen.
         
-        wait_until_is_on_screen(key: str, timeout: int = 200, poll_interval: int = 2) -> None:
+        poll_for_images(detector: ChangeDetector, *dict_keys: str, confidence: float = 0.9) -> dict | None:
+            Runs a single poll of a wait for images, matching only if the screen changed since the previous poll.
+        
+        wait_until_is_on_screen(key: str, timeout: int = 200, poll_interval: int = 2, min_poll_interval: float = 0.1) -> None:
             Waits until a specified image appears on the screen or times out after the given duration.
         
+        wait_until_any_is_on_screen(*keys: str, timeout: int = 200, poll_interval: int = 2, min_poll_interval: float = 0.1) -> str | None:
+            Waits until any of the specified images appears on the screen, clicks it and returns its key.
+        
         alert_window(message: str, title: str) -> None:
             Displays a Windows message box with the given message and title.
     """
 
     folder_path = dirname(abspath(__file__))
     png = png
+    # Half the side (in pixels) of the area around the cursor that must settle before a click
+    hover_margin = 48
+
+    def __init__(
+        self,
+        preload_templates: bool = False,
+        template_cache_bytes: int = 256 * 1024 * 1024,
+        match_engine: str = "exhaustive",
+        capture: CaptureService | None = None,
+        max_frame_age: float = 0.1,
+        settler: Settler | None = None,
+        window_provider=None,
+        matcher: MatcherPool | None = None,
+        location_cache: LocationCache | None = None,
+        template_bundle: str | None = None,
+        backend=None,
+        tracer: Tracer | None = None,
+        scales: tuple[float, ...] | None = None,
+        template_scale: float = 1.0,
+        scale_memory: ScaleMemory | None = None,
+        text_entry: str = "keys"
+    ):
+        """
+        Initializes the automation core.
 
-    def __init__(self):
+        Args:
+            preload_templates (bool, optional): Whether to decode every image in `png` right away instead of on
+                                                first use. Defaults to False.
+            template_cache_bytes (int, optional): The byte budget of the decoded template cache. Defaults to 256 MiB.
+            match_engine (str, optional): The template matching engine, "exhaustive" for a full resolution search
+                                          or "pyramid" for a coarse-to-fine search. Defaults to "exhaustive".
+            capture (CaptureService | None, optional): A background capture service to read frames from instead of
+                                                       taking a screenshot on every search. It is started if it
+                                                       is not running. Defaults to None.
+            max_frame_age (float, optional): The maximum age (in seconds) of a frame read from `capture`. Defaults to 0.1 seconds.
+            settler (Settler | None, optional): Replaces the fixed delays between actions with waits that end as soon
+                                                as the screen stops changing. Defaults to None, which keeps the
+                                                fixed delays.
+            window_provider (optional): The provider the window registry enumerates and focuses windows with.
+                                        Defaults to None, which uses the windows of `backend`.
+            matcher (MatcherPool | None, optional): A pool to match several templates in parallel with. Defaults to
+                                                    None, which matches them one by one.
+            location_cache (LocationCache | None, optional): A persistent cache of where each image was found,
+                                                             verified against the live pixels before any search.
+                                                             Defaults to None.
+            template_bundle (str | None, optional): The path of a bundle written by `bundle.build_bundle`. The
+                                                    templates it holds are memory-mapped from it instead of being
+                                                    decoded from the image files. Images whose file changed since
+                                                    the bundle was built are read from the file, with a warning.
+                                                    Defaults to None.
+            backend (optional): The backend, or the name of one in `backends.BACKENDS`, that captures the
+                                screen, performs input, lists windows and shows alerts. Defaults to None,
+                                which uses "win32". Its desktop libraries are only imported on first use.
+            tracer (Tracer | None, optional): A tracer to record where the time of every operation goes.
+                                              Defaults to None, which disables tracing.
+            scales (tuple[float, ...] | None, optional): The display scale factors to match the templates at, such
+                                                         as `scales.DEFAULT_SCALES`. The templates are resized
+                                                         once per scale and kept in the template cache. Defaults
+                                                         to None, which matches the images as they are.
+            template_scale (float, optional): The display scale the images were captured at. Defaults to 1.0.
+            scale_memory (ScaleMemory | None, optional): Remembers the scale that matched on this host, which is
+                                                         tried first. Defaults to None, which keeps it in memory
+                                                         for the life of the core.
+            text_entry (str, optional): How text is typed: "keys" presses one key at a time, "batch" injects the
+                                        whole text at once and "paste" pastes it through the clipboard. See
+                                        `type_text`. Defaults to "keys".
+
+        Raises:
+            ValueError: If `match_engine`, `backend` or `text_entry` is not known.
+        """
+        if match_engine not in ENGINES:
+            raise ValueError(f"Unknown match engine '{match_engine}', expected one of {', '.join(ENGINES)}")
+        if text_entry not in TEXT_ENTRY_MODES:
+            raise ValueError(f"Unknown text entry mode '{text_entry}', expected one of {', '.join(TEXT_ENTRY_MODES)}")
+        self.text_entry = text_entry
+        self.match_engine = match_engine
+        self.backend = load_backend(backend)
+        self.tracer = tracer if tracer is not None else NullTracer()
+        self.scales = tuple(scales) if scales is not None else None
+        self.template_scale = template_scale
+        self.scale_memory = scale_memory if scale_memory is not None else ScaleMemory()
+        self.capture = capture
+        self.max_frame_age = max_frame_age
+        self.settler = settler
+        self.matcher = matcher
+        self.location_cache = location_cache
+        self.display_scale = self.backend.display_scale()
+        if capture is not None:
+            capture.start()
         self.actual_window = None
-        self.app = application.Application()
+        self.windows = WindowRegistry(
+            window_provider if window_provider is not None else self.backend.windows, tracer=self.tracer
+        )
+        bundle = None
+        if template_bundle is not None:
+            bundle = TemplateBundle(template_bundle)
+            # Templates of images edited since the bundle was built are read from their files instead
+            stale = bundle.stale_files(join(self.folder_path, "images"))
+            if stale:
+                bundle.exclude(stale)
+                warnings.warn(
+                    f"Template bundle '{template_bundle}' is out of date for {', '.join(sorted(stale))}; "
+                    f"reading those images from their files. Run 'python bundle.py build' to rebuild it.",
+                    stacklevel=2
+                )
+        self.templates = TemplateCache(self.find_image_path, max_bytes=template_cache_bytes, bundle=bundle)
+        self.search_region = None
+        self.hints = LocationHints()
+        if preload_templates:
+            factors = [scale / template_scale for scale in self.scales] if self.scales is not None else ()
+            self.templates.preload(self.png, factors=factors)
     
-    @staticmethod
-    def get_active_window_names() -> list[str]:
+    def get_active_window_names(self) -> list[str]:
         """
         Returns a list of all currently active window titles.
 
+        This is an instance method served from the window index of the core; it can no longer be called on the
+        class as `Core.get_active_window_names()`.
+
         Returns:
             list of str: A list containing the titles of all currently active windows.
         """
-        return getAllTitles()
+        return self.windows.titles()
 
-    @staticmethod
-    def get_active_window_name() -> str:
+    def get_active_window_name(self) -> str:
         """
         Returns the title of the currently active window.
 
+        This is an instance method that asks the window provider of the core; it can no longer be called on the
+        class as `Core.get_active_window_name()`.
+
         Returns:
             str: The title of the currently active window.
         """
-        return getActiveWindowTitle()
+        return self.windows.active_title()
 
-    def __open_the_window(self, title: str) -> None:
+    def __open_the_window(self, title: str) -> bool:
         """
         Focuses the window with the specified title using the win32 API.
 
@@ -109,13 +273,16 @@ class Core:
         Args:
             title (str): The exact title of the window to focus on.
 
+        Returns:
+            bool: False if the window closed since the window index was last refreshed, True otherwise.
+
         Raises:
             ValueError: If multiple windows with the same title are found or if no window is found with the specified title.
 
         """
         try:
             # Find all window handles with the given title
-            handles = findwindows.find_windows(title=title)
+            handles = [window.handle for window in self.windows.find(title=title)]
             
             if len(handles) > 1:
                 raise ValueError('Multiple windows with this title were found')
@@ -124,14 +291,53 @@ class Core:
 
             handle = handles[0]  # Use the first handle if there's only one
 
-            # Connect to the window and set focus
-            self.app.connect(handle=handle)
-            window = self.app.window(handle=handle)
-            window.set_focus()
+            # Set focus, reusing the connection to the window
+            handle = self.__focus(handle, title)
+            if handle is None:
+                return False
+
+            # Scope image searches to the window that was just focused
+            self.search_region = self.windows.client_rect(handle)
+            self.actual_window = title
 
         except ValueError as e:
             # Display an error message if there's an issue
             self.alert_window(str(e), 'Error')
+        return True
+
+    def __focus(self, handle: int, title: str) -> int | None:
+        """
+        Focuses a window, enumerating the windows again and retrying once if the indexed handle cannot be focused.
+
+        Args:
+            handle (int): The handle of the window in the window index.
+            title (str): The title of the window.
+
+        Returns:
+            int | None: The handle that was focused, or None if no window with the title is open anymore.
+        """
+        try:
+            self.windows.focus(handle)
+            return handle
+        except Exception:
+            # The index may still list a window that closed since the last enumeration
+            self.windows.invalidate()
+            handles = [window.handle for window in self.windows.find(title=title)]
+            if not handles:
+                return None
+            self.windows.focus(handles[0])
+            return handles[0]
+
+    def __scope_to_window(self, handle: int, title: str) -> None:
+        """
+        Uses the client area of an already active window as the `search_region`.
+
+        Args:
+            handle (int): The handle of the window.
+            title (str): The title of the window.
+        """
+        self.search_region = self.windows.client_rect(handle)
+        self.actual_window = title
 
     def open_window(self, window_title: str) -> None:
         """
@@ -140,7 +346,8 @@ class Core:
         This method checks if the given window title is among the active windows. 
         If it is, but the currently active window title does not match the given title, 
         it attempts to focus on the specified window. If the window title is not found 
-        among the active windows, a ValueError is raised.
+        among the active windows, a ValueError is raised. In both cases the area of the window becomes the
+        `search_region`, which image searches try before the full screen.
 
         Args:
             window_title (str): The title of the window to focus on.
@@ -148,13 +355,15 @@ class Core:
         Raises:
             ValueError: If the window with the specified title is not found among the active windows.
         """
-        # Get a list of all currently active window titles
-        active_window_titles = self.get_active_window_names()
-        
-        if window_title in active_window_titles:
+        # Look the title up in the window index, which enumerates the windows only when it is stale
+        if self.windows.find(title=window_title):
             # If the specified window is not currently active, focus on it
-            if self.get_active_window_name() != window_title:
-                self.__open_the_window(title=window_title)
+            active = self.windows.active()
+            if active is None or active.title != window_title:
+                if not self.__open_the_window(title=window_title):
+                    raise ValueError("Cannot find window with the title '{}' among active windows.".format(window_title))
+            elif self.actual_window != window_title:
+                self.__scope_to_window(active.handle, window_title)
         else:
             # Raise an error if the window title is not found among active windows
             raise ValueError("Cannot find window with the title '{}' among active windows.".format(window_title))
@@ -173,7 +382,7 @@ class Core:
             ValueError: If the `programdir` is an empty string or None.
         """
         if programdir:
-            system(f"start \"{programdir}\"")
+            self.backend.open_program(programdir)
         else:
             raise ValueError("Program directory is not set.")
     
@@ -182,7 +391,8 @@ class Core:
         Waits until the specified window becomes active or raises a TimeoutError.
 
         This method repeatedly checks if the window with the specified title is the 
-        currently active window. It will wait for up to the specified timeout period 
+        currently active window, sleeping between checks with a growing interval of up to half a second.
+        It will wait for up to the specified timeout period 
         before raising a TimeoutError if the window does not become active.
 
         Args:
@@ -196,11 +406,11 @@ class Core:
         if not window:
             raise ValueError("Window title must be specified.")
         
-        end_time = time.time() + timeout
-        
-        while time.time() < end_time:
-            if self.get_active_window_name() == window:
-                return
+        with self.tracer.span("wait", window=window) as span:
+            active = self.windows.wait_until_active(window, timeout)
+            span.set(found=active)
+        if active:
+            return
         
         raise TimeoutError(f"The window '{window}' did not become active within the timeout period of {timeout} seconds.")
 
@@ -224,18 +434,22 @@ class Core:
             diff (tuple[tuple[int, int], tuple[int, int], tuple[int, int]], optional): Offsets (x, y) to adjust the click position for each image. Defaults to ((0, 0), (0, 0), (0, 0)).
 
         Raises:
-            ValueError: If the lengths of `auth_img_array` and `auth_str_array` do not match.
+            ValueError: If the lengths of `auth_img_array` and `auth_str_array` do not match, or if an image
+                        cannot be located on the screen.
         """
         if len(auth_img_array) != len(auth_str_array):
             raise ValueError("Length of image array must match length of string array.")
         
         for difference, img, string in zip(diff, auth_img_array, auth_str_array):
-            sleep(0.5)  # Sleep for half a second to allow for any potential screen transitions
-            x, y = locateCenterOnScreen(img, minSearchTime=2, confidence=0.9)
-            moveTo(x + difference[0], y + difference[1])
-            doubleClick()
+            self._pause(0.5, self.search_region)  # Allow for any potential screen transitions
+            match = self._search({img: self.templates.template_from_file(img)}, min_search_time=2)
+            if match is None:
+                raise ValueError(f"Image '{img}' was not found on the screen")
+            x, y = match[1]
+            self._input("move_to", x + difference[0], y + difference[1])
+            self._input("double_click")
             if string:
-                typewrite(string)
+                self.type_text(string)
 
     def search_open_and_auth(
         self,
@@ -317,21 +531,27 @@ class Core:
         dict_key: str,
         difx: int = 0,
         dify: int = 0,
-        delay: float = 0.2
+        delay: float = 0.2,
+        until: str | None = None
     ) -> None:
         """
         Finds an image on the screen and performs a click at its location with optional offsets and delay.
 
-        This method uses the provided `dict_key` to locate the path of an image file through the `find_image_path` method.
-        It then finds the center of the image on the screen and moves the cursor to that location, applying optional 
+        This method uses the provided `dict_key` to get the decoded image from the template cache, which reads the
+        file found through the `find_image_path` method only on the first lookup. It then finds the center of the
+        image on the screen, searching for up to one second, and moves the cursor to that location, applying optional
         pixel offsets (`difx` and `dify`). After moving to the location, it waits for a specified delay before performing 
         a double-click. Another delay is applied after the click to ensure that the action is properly registered.
+        When a `settler` is set, the delays are replaced by waits for the area around the cursor, and then the
+        focused window, to stop changing, and the wait after the click also ends when the `until` image appears.
 
         Args:
             dict_key (str): The key used to look up the image file path in the image dictionary.
             difx (int, optional): The horizontal offset (in pixels) to apply to the click position. Defaults to 0.
             dify (int, optional): The vertical offset (in pixels) to apply to the click position. Defaults to 0.
             delay (float, optional): The delay (in seconds) to wait before and after clicking. Defaults to 0.2 seconds.
+            until (str | None, optional): The key of an image expected to appear after the click, which ends the wait
+                                          after the click when a `settler` is set. Defaults to None.
 
         Raises:
             FileNotFoundError: If the image file specified by `dict_key` cannot be found.
@@ -341,20 +561,331 @@ class Core:
             >>> instance.find_img_and_click('button', difx=10, dify=-5, delay=0.5)
             # Finds the image associated with 'button', moves to (10, -5) offset from the center, and clicks with a 0.5-second delay.
         """
-        place = Core.find_image_path(dict_key=dict_key)
-        x, y = locateCenterOnScreen(place, minSearchTime=1, confidence=0.9)
-        moveTo(x + difx, y + dify)
-        sleep(delay)
-        doubleClick()
-        sleep(delay)
+        match = self._search({dict_key: self.templates.template(dict_key)}, min_search_time=1)
+        if match is None:
+            raise ValueError(f"Image '{dict_key}' was not found on the screen")
+        self.click_at(match[1], difx, dify, delay, until)
+
+    def click_at(
+        self,
+        point: tuple[int, int],
+        difx: int = 0,
+        dify: int = 0,
+        delay: float = 0.2,
+        until: str | None = None
+    ) -> None:
+        """
+        Moves the cursor to a point, applying the given offsets, and double-clicks with a pause before and after.
+
+        Args:
+            point (tuple[int, int]): The (x, y) screen position, such as a value returned by `locate_many`.
+            difx (int, optional): The horizontal offset (in pixels) to apply to the click position. Defaults to 0.
+            dify (int, optional): The vertical offset (in pixels) to apply to the click position. Defaults to 0.
+            delay (float, optional): The delay (in seconds) to wait before and after clicking, unused when a
+                                     `settler` is set. Defaults to 0.2 seconds.
+            until (str | None, optional): The key of an image that ends the wait after the click. Defaults to None.
+        """
+        x, y = point[0] + difx, point[1] + dify
+        self._input("move_to", x, y)
+        # Hover effects are drawn around the cursor, so only that area has to settle before the click
+        self._pause(delay, (x - self.hover_margin, y - self.hover_margin, 2 * self.hover_margin, 2 * self.hover_margin))
+        self._input("double_click")
+        self._pause(delay, self.search_region, until)
+
+    def type_text(self, text: str) -> None:
+        """
+        Types text into the focused field with the `text_entry` method, falling back to one key at a time.
+
+        "batch" injects the whole text in a single batch of key events and "paste" pastes it through the
+        clipboard, putting the previous clipboard text back afterwards. When the input backend cannot use the
+        chosen method, or refuses it before anything was typed (such as "paste" while the clipboard holds an
+        image), the next method in `TEXT_ENTRY_FALLBACKS` is tried, ending with one key at a time, and every
+        fallback is counted by the `tracer`. Failures after part or all of the text was entered, such as a
+        clipboard that cannot be put back after pasting, raise `RuntimeError` instead of falling back, so the
+        text is never typed twice. Every entry is recorded as an "input" span with the method and the
+        number of characters, never the text itself, so the methods can be compared.
+
+        Args:
+            text (str): The text to type.
+        """
+        for mode in TEXT_ENTRY_FALLBACKS[self.text_entry]:
+            try:
+                with self.tracer.span("input", action="type_text", mode=mode, characters=len(text)):
+                    if mode == "batch":
+                        self.backend.input.send_text(text)
+                    else:
+                        self.backend.input.paste_text(text)
+                return
+            except (NotImplementedError, OSError) as error:
+                self.tracer.count("text_entry_fallbacks", mode=mode, type=type(error).__name__)
+        with self.tracer.span("input", action="type_text", mode="keys", characters=len(text)):
+            self.backend.input.type_text(text)
+
+    def _input(self, action: str, *args) -> None:
+        """
+        Dispatches a mouse or keyboard action to the input backend. Typed text is not recorded in the span.
+        """
+        with self.tracer.span("input", action=action):
+            getattr(self.backend.input, action)(*args)
+
+    def _pause(self, delay: float, region: Region | None = None, until: str | None = None) -> None:
+        """
+        Sleeps for `delay` seconds, or with a `settler`, waits until `region` stops changing or the `until` image appears.
+        """
+        if self.settler is None:
+            with self.tracer.span("sleep", delay=delay):
+                sleep(delay)
+            return
+        if until is not None:
+            needles = {until: self.templates.template(until)}
+
+            def postcondition(frame) -> bool:
+                return self._match_frame(frame, needles)[until] is not None
+        else:
+            postcondition = None
+
+        with self.tracer.span("settle", until=until) as span:
+            span.set(settled=self.settler.wait(self._frame, region, postcondition))
+
+    def _locate_needles(
+        self,
+        needles: dict,
+        confidence: float = 0.9,
+        grayscale: bool = False,
+        region: Region | None = None
+    ) -> dict:
+        """
+        Takes a single screenshot and matches every template in `needles` against it.
+
+        Each template is searched first around the location where it was last found, then inside `region` (or
+        the `search_region` of the focused window) and finally on the whole screenshot. When `region` is given
+        the search stops there instead of falling back to the whole screenshot.
+
+        Args:
+            needles (dict): The `Template` objects to look for, keyed by any name.
+            confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+            grayscale (bool, optional): Whether to match in grayscale. Defaults to False.
+            region (Region | None, optional): The (left, top, width, height) area to limit the search to. Defaults to None.
+
+        Returns:
+            dict: The (x, y) center of each template on the screen, or None for templates that were not found,
+                  in the same order as `needles`.
+        """
+        with self._frame() as frame:
+            return self._match_frame(frame, needles, confidence, grayscale, region)
+
+    @contextmanager
+    def _frame(self):
+        """
+        Yields the current screen as a BGR array, either a new screenshot or the newest frame of `capture`.
+        Frames from `capture` are not copied and stay valid until the `with` block ends.
+        """
+        if self.capture is None:
+            with self.tracer.span("capture"):
+                frame = self.backend.screen.grab()
+            yield frame
+            return
+        with ExitStack() as stack:
+            with self.tracer.span("capture", background=True):
+                frame = stack.enter_context(self.capture.hold(max_age=self.max_frame_age))
+            yield frame.array
+
+    def _match_frame(
+        self,
+        frame,
+        needles: dict,
+        confidence: float = 0.9,
+        grayscale: bool = False,
+        region: Region | None = None,
+        dirty: list[Region] | None = None
+    ) -> dict:
+        """
+        Matches every template in `needles` against an already captured frame.
+
+        When `dirty` is given, only the changed rectangles grown by the size of each template are searched,
+        since a template that was not on the previous frame can only appear where pixels changed. When a
+        `location_cache` is set, templates whose stored location still has the same pixels are not searched at
+        all. When a `matcher` pool is set, the templates are matched in parallel. When `scales` are set, the
+        templates that were not found are searched again at the next scale, in the order of `scale_memory`.
+
+        Returns:
+            dict: The (x, y) center of each template on the screen, or None for templates that were not found.
+        """
+        if grayscale:
+            frame = to_gray(frame)
+        if self.scales is None:
+            return self._match_at_scale(frame, needles, confidence, grayscale, region, dirty)
+
+        found = dict.fromkeys(needles)
+        remaining = dict(needles)
+        for attempt, scale in enumerate(self.scale_memory.order(self.display_scale, self.scales)):
+            factor = scale / self.template_scale
+            scaled = {name: template.scaled(factor) for name, template in remaining.items()}
+            for name, point in self._match_at_scale(frame, scaled, confidence, grayscale, region, dirty).items():
+                if point is not None:
+                    found[name] = point
+                    del remaining[name]
+                    self.scale_memory.record(scale)
+                    if attempt:
+                        self.tracer.count("scale_fallbacks", scale=scale)
+            if not remaining:
+                break
+        return found
+
+    def _match_at_scale(
+        self,
+        frame,
+        needles: dict,
+        confidence: float = 0.9,
+        grayscale: bool = False,
+        region: Region | None = None,
+        dirty: list[Region] | None = None
+    ) -> dict:
+        """
+        Matches every template in `needles`, already resized for one display scale, against a frame already
+        converted to grayscale when `grayscale` is True. See `_match_frame`.
+        """
+        height, width = frame.shape[:2]
+        cached = {}
+        geometry = None
+        if self.location_cache is not None:
+            geometry = self.location_cache.geometry(frame, self.display_scale, self.search_region)
+        plans = {}
+        for name, template in needles.items():
+            if geometry is not None:
+                box = self.location_cache.lookup(name, geometry, frame, within=region)
+                if box is not None:
+                    cached[name] = box
+                    self.tracer.count("location_cache_hits")
+                    continue
+            needle = template.pyramid(grayscale)
+            if dirty is not None:
+                margin = max(needle.base.shape[:2])
+                candidates = [expand(area, margin) for area in dirty]
+                if region is not None:
+                    candidates = [intersect(area, region) for area in candidates if area is not None]
+                hint = None
+            else:
+                hint = self.hints.region(name)
+                # An explicit region bounds every searched area, the hint included
+                if hint is not None and region is not None:
+                    hint = intersect(hint, region)
+                candidates = [hint] if hint is not None else []
+                if region is not None:
+                    candidates.append(region)
+                else:
+                    if self.search_region is not None:
+                        candidates.append(self.search_region)
+                    candidates.append((0, 0, width, height))
+            areas = []
+            for area in candidates:
+                area = clip(area, width, height) if area is not None else None
+                if area is not None and area not in areas:
+                    areas.append(area)
+            plans[name] = (needle, areas, hint)
+
+        if self.matcher is not None and len(plans) > 1:
+            results = self.matcher.locate_all(
+                frame, {name: plan[:2] for name, plan in plans.items()}, confidence, self.match_engine, self.tracer
+            )
+        else:
+            # Downscaled copies of each searched area are shared by all the templates
+            pyramids = {}
+            results = {}
+            for name, (needle, areas, _) in plans.items():
+                with self.tracer.span("match", template=str(name), engine=self.match_engine, confidence=confidence,
+                                      areas=len(areas)) as span:
+                    results[name] = locate_in_areas(frame, needle, areas, confidence, self.match_engine, pyramids)
+                    box, index, score = results[name]
+                    span.set(found=box is not None, area=index, score=score)
+
+        found = {}
+        for name in needles:
+            if name in cached:
+                box = cached[name]
+            else:
+                box, index, _ = results[name]
+                hint = plans[name][2]
+                if hint is not None:
+                    self.hints.count(index == 0 and plans[name][1][0] == clip(hint, width, height))
+                if box is not None and geometry is not None:
+                    self.location_cache.store(name, geometry, frame, box)
+            if box is not None:
+                self.hints.record(name, box)
+            found[name] = center(box) if box is not None else None
+        return found
+
+    def _search(
+        self,
+        needles: dict,
+        min_search_time: float = 0,
+        confidence: float = 0.9,
+        grayscale: bool = False,
+        region: Region | None = None
+    ) -> tuple | None:
+        """
+        Repeats single screenshot matching until one of the templates is found or `min_search_time` elapses.
+
+        Returns:
+            tuple | None: The (name, (x, y)) of the first template found, following the order of `needles`,
+                          or None if none of them was found in time.
+        """
+        end_time = time() + min_search_time
+        attempts = 0
+        with self.tracer.span("search", templates=len(needles), min_search_time=min_search_time) as span:
+            while True:
+                attempts += 1
+                for name, point in self._locate_needles(needles, confidence, grayscale, region).items():
+                    if point is not None:
+                        span.set(attempts=attempts, found=str(name))
+                        return name, point
+                if time() >= end_time:
+                    span.set(attempts=attempts, found=None)
+                    return None
+
+    def locate_many(
+        self,
+        *dict_keys: str,
+        confidence: float = 0.9,
+        grayscale: bool = False,
+        region: Region | None = None
+    ) -> dict[str, tuple[int, int] | None]:
+        """
+        Locates several images on a single screenshot.
+
+        This method takes one screenshot and matches the templates of every given key against it, instead of
+        capturing the screen once per image. Missing images do not cost any search time.
+
+        Args:
+            *dict_keys (str): The keys used to look up the images in the image dictionary.
+            confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+            grayscale (bool, optional): Whether to match in grayscale, which is faster but less strict. Defaults to False.
+            region (Region | None, optional): The (left, top, width, height) area to limit the search to. Defaults to
+                                              None, which searches the focused window first and then the whole screen.
+
+        Returns:
+            dict[str, tuple[int, int] | None]: The (x, y) center of each image on the screen, or None for the
+                                               images that were not found.
+
+        Raises:
+            ValueError: If a key is not found in the image dictionary.
+            FileNotFoundError: If the image file of a key cannot be found.
+
+        Example:
+            >>> instance.locate_many('continue', 'close')
+            {'continue': (640, 412), 'close': None}
+        """
+        needles = {key: self.templates.template(key) for key in dict_keys}
+        return self._locate_needles(needles, confidence, grayscale, region)
 
     def try_click_one_or_more(self, *dict_key_tuple: str) -> None:
         """
         Attempts to find and click each specified image on the screen.
 
-        This method iterates over the provided image keys, attempting to locate and click each image using the 
-        `find_img_and_click` method. If an image cannot be found or if an error occurs during the click attempt, 
-        the method catches the exception and continues with the next image key.
+        This method locates all the provided image keys on a single screenshot and clicks the first one found. If
+        there are keys after the clicked one, the screen is captured again and only those keys are searched, since
+        the click may have changed the screen. Images that cannot be found, or whose keys or files are invalid, are
+        skipped without waiting.
 
         Args:
             *dict_key_tuple (str): One or more keys used to look up image file paths in the image dictionary. Each key corresponds to an image to be found and clicked on the screen.
@@ -363,17 +894,60 @@ class Core:
             >>> instance.try_click_one_or_more('button1', 'button2', 'button3')
             # Attempts to find and click images associated with 'button1', 'button2', and 'button3' in sequence.
         """
+        needles = {}
         for key in dict_key_tuple:
             try:
-                self.find_img_and_click(key)
-            except Exception:
-                pass
+                needles[key] = self.templates.template(key)
+            except Exception as error:
+                self.tracer.count("swallowed_exceptions", method="try_click_one_or_more", type=type(error).__name__)
+
+        remaining = list(needles)
+        while remaining:
+            match = self._search({key: needles[key] for key in remaining})
+            if match is None:
+                return
+            key, point = match
+            try:
+                self.click_at(point)
+            except Exception as error:
+                self.tracer.count("swallowed_exceptions", method="try_click_one_or_more", type=type(error).__name__)
+            remaining = remaining[remaining.index(key) + 1:]
+
+    def poll_for_images(
+        self,
+        detector: ChangeDetector,
+        *dict_keys: str,
+        confidence: float = 0.9
+    ) -> dict[str, tuple[int, int] | None] | None:
+        """
+        Runs a single poll of a wait for images, without clicking anything.
+
+        The screen is captured and compared with the previous frame seen by `detector`. If nothing changed the
+        templates are not matched, and if something changed they are matched only around the changed parts.
+
+        Args:
+            detector (ChangeDetector): The detector holding the previous frame of the wait.
+            *dict_keys (str): The keys used to look up the images in the image dictionary.
+            confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+
+        Returns:
+            dict[str, tuple[int, int] | None] | None: The (x, y) center of each image, or None for the images that
+                                                      were not found, or None instead of the dictionary if the
+                                                      screen did not change.
+        """
+        needles = {key: self.templates.template(key) for key in dict_keys}
+        with self._frame() as frame:
+            dirty = detector.update(frame)
+            if dirty is not None and not dirty:
+                return None
+            return self._match_frame(frame, needles, confidence, dirty=dirty)
 
     def wait_until_is_on_screen(
         self,
         key: str,
         timeout: int = 200,
-        poll_interval: int = 2
+        poll_interval: int = 2,
+        min_poll_interval: float = 0.1
     ) -> None:
         """
         Waits until a specified image appears on the screen or times out after the given duration.
@@ -381,43 +955,92 @@ class Core:
         This method repeatedly attempts to find and click the image associated with the provided key. It waits 
         for a specified duration (`timeout`) and checks for the image's presence at regular intervals (`poll_interval`).
         If the image is found within the timeout period, the method performs a click and returns. If the timeout is reached 
-        without finding the image, the method stops attempting and returns `None`.
+        without finding the image, the method stops attempting and returns `None`. See `wait_until_any_is_on_screen`
+        for how the checks are spaced and skipped while the screen does not change.
 
         Args:
             key (str): The key used to look up the image file path in the image dictionary. This image is what the method 
                     is waiting to appear on the screen.
             timeout (int, optional): The maximum amount of time (in seconds) to wait for the image to appear. Defaults to 200 seconds.
-            poll_interval (int, optional): The interval (in seconds) between each check for the image. Defaults to 2 seconds.
+            poll_interval (int, optional): The longest interval (in seconds) between each check for the image. Defaults to 2 seconds.
+            min_poll_interval (float, optional): The interval (in seconds) right after the screen changes. Defaults to 0.1 seconds.
 
         Returns:
             None: The method does not return a value but will attempt to click the image if it appears before the timeout.
 
         Example:
             >>> instance.wait_until_is_on_screen('loading_spinner', timeout=100, poll_interval=5)
-            # Waits up to 100 seconds, checking every 5 seconds, for the image associated with 'loading_spinner' to appear on the screen.
+            # Waits up to 100 seconds, checking at most every 5 seconds, for the image associated with 'loading_spinner' to appear on the screen.
         """
+        self.wait_until_any_is_on_screen(
+            key, timeout=timeout, poll_interval=poll_interval, min_poll_interval=min_poll_interval
+        )
+
+    def wait_until_any_is_on_screen(
+        self,
+        *keys: str,
+        timeout: int = 200,
+        poll_interval: int = 2,
+        min_poll_interval: float = 0.1
+    ) -> str | None:
+        """
+        Waits until any of the specified images appears on the screen, clicks it and returns its key.
+
+        Every poll takes a single screenshot and compares it with the previous one. If nothing changed the
+        templates are not matched at all, and if something changed they are matched only around the changed
+        parts. The interval between polls drops to `min_poll_interval` right after a change and doubles on every
+        idle poll up to `poll_interval`. If several images are on the screen at the same time, the one passed
+        first is clicked.
+
+        Args:
+            *keys (str): The keys used to look up the images in the image dictionary.
+            timeout (int, optional): The maximum amount of time (in seconds) to wait. Defaults to 200 seconds.
+            poll_interval (int, optional): The longest interval (in seconds) between each check. Defaults to 2 seconds.
+            min_poll_interval (float, optional): The interval (in seconds) right after the screen changes. Defaults to 0.1 seconds.
+
+        Returns:
+            str | None: The key of the image that was found and clicked, or None if the timeout was reached.
+
+        Example:
+            >>> instance.wait_until_any_is_on_screen('continue', 'evadeerror', 'close', timeout=60)
+            'evadeerror'
+        """
+        detector = ChangeDetector()
+        backoff = Backoff(min_poll_interval, poll_interval)
         end_time = time() + timeout
-        while time() < end_time:
-            try:
-                self.find_img_and_click(key)
-                return
-            except:
-                sleep(poll_interval)
+        polls = 0
+        with self.tracer.span("wait", templates=len(keys), timeout=timeout) as span:
+            while True:
+                polls += 1
+                found = self.poll_for_images(detector, *keys)
+                if found is not None:
+                    for key, point in found.items():
+                        if point is not None:
+                            span.set(polls=polls, skipped=detector.unchanged, found=str(key))
+                            self.click_at(point)
+                            return key
+                    interval = backoff.reset()
+                else:
+                    interval = backoff.grow()
+                remaining = end_time - time()
+                if remaining <= 0:
+                    span.set(polls=polls, skipped=detector.unchanged, found=None)
+                    return None
+                sleep(min(interval, remaining))
 
-    @staticmethod
-    def alert_window(message: str, title: str) -> None:
+    def alert_window(self, message: str, title: str) -> None:
         """
         Displays a Windows message box with the given message and title.
 
-        This static method uses the Windows API to create and display a message box with a specified message and title.
-        It is intended for displaying alerts or notifications to the user within a Windows environment.
+        This method shows the alert through the alerts of `backend`, a message box created with the Windows API by
+        default. It is intended for displaying alerts or notifications to the user within a Windows environment.
 
         Args:
             message (str): The text to be displayed in the message box.
             title (str): The title of the message box window.
 
         Example:
-            >>> MyClass.alert_window("Operation completed successfully.", "Success")
+            >>> core.alert_window("Operation completed successfully.", "Success")
             # Displays a message box with the message "Operation completed successfully." and the title "Success".
         """
-        windll.user32.MessageBoxW(0, message, title, 0)
\ No newline at end of file
+        self.backend.alerts.show(message, title)
\ No newline at end of file
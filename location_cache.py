@@ -0,0 +1,181 @@
+import json
+from atexit import register
+from os import replace
+from os.path import exists
+from threading import RLock
+from time import monotonic, time
+from typing import Hashable
+from zlib import crc32
+
+import numpy as np
+
+from regions import Region, clip, crop, intersect
+
+
+def checksum(patch: np.ndarray) -> int:
+    """
+    Returns the CRC-32 of the pixels of a patch.
+    """
+    return crc32(np.ascontiguousarray(patch).data)
+
+
+class LocationCache:
+    """
+    A persistent cache of where each template was found, for each screen and window geometry.
+
+    Every entry stores the match box together with a checksum of the matched pixels. The entry is used only
+    when the screen resolution, the display scale and the window rectangle are the same as when it was stored,
+    and only after checking that the pixels at the box still have the same checksum, which costs a crop and a
+    CRC instead of a full search. Entries that fail the check are dropped. The least recently used entries are
+    evicted beyond `max_entries`. Changes are written to the JSON file at most every `save_interval` seconds
+    and when the process exits.
+
+    Attributes:
+        path (str): The JSON file the cache is stored in.
+        max_entries (int): The maximum number of entries kept.
+        save_interval (float): The minimum time (in seconds) between two writes of the file.
+        hits (int): The number of lookups answered by a verified entry.
+        misses (int): The number of lookups without an entry or whose entry failed the check.
+
+    Example:
+        >>> core = Core(location_cache=LocationCache("locations.json"))
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, save_interval: float = 5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = False
+        self._saved = monotonic()
+        self._lock = RLock()
+        self.load()
+        register(self.save)
+
+    @staticmethod
+    def key(name: Hashable, geometry: tuple) -> str:
+        """
+        Returns the key an entry is stored under. Names keep their type, so the keys 1 and "1" stay apart.
+        """
+        return json.dumps([type(name).__name__, str(name), list(geometry)])
+
+    @staticmethod
+    def geometry(frame: np.ndarray, scale: float, window: Region | None) -> tuple:
+        """
+        Returns the geometry an entry depends on: the frame size, the number of channels, the display scale and the
+        window rectangle. Grayscale and color lookups of the same template are therefore stored apart.
+        """
+        channels = frame.shape[2] if frame.ndim > 2 else 1
+        return frame.shape[1], frame.shape[0], channels, round(scale, 3), list(window) if window is not None else None
+
+    def load(self) -> None:
+        """
+        Reads the entries from the file. A missing or unreadable file leaves the cache empty.
+        """
+        if not exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._entries = {key: entry for key, entry in entries.items() if isinstance(entry, dict)}
+
+    def save(self) -> None:
+        """
+        Writes the entries to the file if they changed, replacing it atomically.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(self._entries, file)
+            replace(temporary, self.path)
+            self._dirty = False
+            self._saved = monotonic()
+
+    def _changed(self) -> None:
+        self._dirty = True
+        if monotonic() - self._saved >= self.save_interval:
+            self.save()
+
+    def lookup(
+        self,
+        name: Hashable,
+        geometry: tuple,
+        frame: np.ndarray,
+        within: Region | None = None
+    ) -> Region | None:
+        """
+        Returns the stored box of a template if its pixels on `frame` still match the stored checksum.
+
+        Args:
+            name (Hashable): The key of the template.
+            geometry (tuple): The current geometry, as returned by `geometry`.
+            frame (numpy.ndarray): The current frame.
+            within (Region | None, optional): The area the box must lie in. A box outside of it is a miss, but
+                                              the entry is kept. Defaults to None.
+
+        Returns:
+            Region | None: The (left, top, width, height) box of the template, or None.
+        """
+        key = self.key(name, geometry)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            box = tuple(entry["box"])
+            if within is not None and intersect(box, within) != box:
+                self.misses += 1
+                return None
+            area = clip(box, frame.shape[1], frame.shape[0])
+            if area != box or list(frame.shape[2:]) != entry["channels"] or checksum(crop(frame, box)) != entry["crc"]:
+                del self._entries[key]
+                self.misses += 1
+                self._changed()
+                return None
+            entry["used"] = time()
+            self.hits += 1
+            return box
+
+    def store(self, name: Hashable, geometry: tuple, frame: np.ndarray, box: Region) -> None:
+        """
+        Stores where a template was found, with the checksum of the matched pixels.
+        """
+        with self._lock:
+            self._entries[self.key(name, geometry)] = {
+                "box": list(box),
+                "channels": list(frame.shape[2:]),
+                "crc": checksum(crop(frame, box)),
+                "used": time(),
+            }
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda key: self._entries[key]["used"])
+                for key in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+            self._changed()
+
+    def invalidate(self, name: Hashable | None = None) -> None:
+        """
+        Drops the entries of a template, or every entry if `name` is None.
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                prefix = json.dumps([type(name).__name__, str(name)])[:-1] + ","
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+            self._changed()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the number of hits, misses and stored entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
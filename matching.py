@@ -0,0 +1,266 @@
+from threading import Lock
+
+import cv2
+import numpy as np
+
+from regions import clip, crop
+
+
+class Pyramid:
+    """
+    Successively halved copies of an image, built on first access.
+
+    Level 0 is the image itself and every following level halves the width and height of the previous one,
+    so a point (x, y) on level n maps to about (x * 2 ** n, y * 2 ** n) on the original image.
+
+    Args:
+        image (numpy.ndarray): The full resolution image.
+        levels (list[numpy.ndarray], optional): Levels 1, 2, ... computed in advance, such as the ones stored in
+                                                a template bundle. Defaults to ().
+
+    Attributes:
+        base (numpy.ndarray): The full resolution image.
+        nbytes (int): The number of bytes held by the downscaled levels, not counting the image itself.
+    """
+
+    def __init__(self, image: np.ndarray, levels: list[np.ndarray] = ()):
+        self._levels = [image, *levels]
+        self._lock = Lock()
+
+    @property
+    def base(self) -> np.ndarray:
+        return self._levels[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels[1:])
+
+    def level(self, n: int) -> np.ndarray:
+        """
+        Returns the image downscaled by a factor of 2 ** n.
+        """
+        # Templates shared by several matcher threads may be downscaled concurrently
+        with self._lock:
+            while len(self._levels) <= n:
+                previous = self._levels[-1]
+                height, width = previous.shape[:2]
+                self._levels.append(
+                    cv2.resize(previous, (max(width // 2, 1), max(height // 2, 1)), interpolation=cv2.INTER_AREA)
+                )
+            return self._levels[n]
+
+
+def _base(image: np.ndarray | Pyramid) -> np.ndarray:
+    return image.base if isinstance(image, Pyramid) else image
+
+
+def best_match(haystack: np.ndarray, needle: np.ndarray) -> tuple[float, tuple[int, int]]:
+    """
+    Returns the highest correlation score of a template over a frame and its (left, top) position.
+    """
+    result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def locate(
+    haystack: np.ndarray | Pyramid,
+    needle: np.ndarray | Pyramid,
+    confidence: float = 0.9
+) -> tuple[tuple[int, int, int, int] | None, float]:
+    """
+    Finds the best match of a template inside a frame with an exhaustive search at full resolution.
+
+    The search uses normalized cross-correlation (`cv2.TM_CCOEFF_NORMED`), the same measure `pyautogui` uses
+    when a `confidence` is given. Both images must have the same number of channels.
+
+    Args:
+        haystack (numpy.ndarray | Pyramid): The frame to search in.
+        needle (numpy.ndarray | Pyramid): The template to search for.
+        confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+
+    Returns:
+        tuple[tuple[int, int, int, int] | None, float]: The (left, top, width, height) box of the best match, or
+                                                        None if no position reaches `confidence`, and the
+                                                        score of the best position (-1.0 when the template
+                                                        does not fit in the frame).
+    """
+    haystack, needle = _base(haystack), _base(needle)
+    height, width = needle.shape[:2]
+    if height > haystack.shape[0] or width > haystack.shape[1]:
+        return None, -1.0
+    max_val, max_loc = best_match(haystack, needle)
+    if max_val < confidence:
+        return None, max_val
+    return (max_loc[0], max_loc[1], width, height), max_val
+
+
+def pyramid_level(needle_shape: tuple, max_level: int = 3, min_size: int = 12) -> int:
+    """
+    Returns the coarsest pyramid level at which a template still has at least `min_size` pixels on each side.
+
+    Args:
+        needle_shape (tuple): The shape of the full resolution template.
+        max_level (int, optional): The coarsest level allowed. Defaults to 3.
+        min_size (int, optional): The smallest side, in pixels, of the downscaled template. Defaults to 12.
+
+    Returns:
+        int: The level to run the coarse search on, 0 when the template is too small to downscale.
+    """
+    size = min(needle_shape[:2])
+    level = 0
+    while level < max_level and size // 2 ** (level + 1) >= min_size:
+        level += 1
+    return level
+
+
+def locate_pyramid(
+    haystack: np.ndarray | Pyramid,
+    needle: np.ndarray | Pyramid,
+    confidence: float = 0.9,
+    max_level: int = 3,
+    min_size: int = 12,
+    candidates: int = 4,
+    slack: float = 0.2
+) -> tuple[tuple[int, int, int, int] | None, float]:
+    """
+    Finds the best match of a template inside a frame with a coarse-to-fine search.
+
+    Both images are downscaled to the coarsest pyramid level at which the template keeps at least `min_size`
+    pixels per side. The best `candidates` peaks scoring at least `confidence - slack` on that level are then
+    refined with a full resolution search restricted to a small window around each of them. The result is the
+    same box `locate` returns whenever the best match is among the coarse candidates, at a fraction of the cost.
+    Templates too small to downscale fall back to the exhaustive search.
+
+    Args:
+        haystack (numpy.ndarray | Pyramid): The frame to search in. Pass a `Pyramid` to share levels between calls.
+        needle (numpy.ndarray | Pyramid): The template to search for. Pass a `Pyramid` to share levels between calls.
+        confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+        max_level (int, optional): The coarsest level allowed. Defaults to 3.
+        min_size (int, optional): The smallest side, in pixels, of the downscaled template. Defaults to 12.
+        candidates (int, optional): The number of coarse peaks refined at full resolution. Defaults to 4.
+        slack (float, optional): How far below `confidence` a coarse peak may score and still be refined. Defaults to 0.2.
+
+    Returns:
+        tuple[tuple[int, int, int, int] | None, float]: The (left, top, width, height) box of the best match, or
+                                                        None if no position reaches `confidence`, and the
+                                                        score of the best refined position. When no coarse
+                                                        peak is refined, the score is the best coarse one.
+    """
+    haystack = haystack if isinstance(haystack, Pyramid) else Pyramid(haystack)
+    needle = needle if isinstance(needle, Pyramid) else Pyramid(needle)
+    frame, template = haystack.base, needle.base
+    height, width = template.shape[:2]
+    if height > frame.shape[0] or width > frame.shape[1]:
+        return None, -1.0
+
+    level = pyramid_level(template.shape, max_level, min_size)
+    small_frame, small_template = haystack.level(level), needle.level(level)
+    if level == 0 or small_template.shape[0] > small_frame.shape[0] or small_template.shape[1] > small_frame.shape[1]:
+        return locate(frame, template, confidence)
+
+    result = cv2.matchTemplate(small_frame, small_template, cv2.TM_CCOEFF_NORMED)
+    small_height, small_width = small_template.shape[:2]
+    scale = 2 ** level
+    pad = 2 * scale
+    best_val, best_loc = -1.0, None
+    for candidate in range(candidates):
+        _, coarse_val, _, coarse_loc = cv2.minMaxLoc(result)
+        if candidate == 0:
+            peak_val = coarse_val
+        if coarse_val < confidence - slack:
+            break
+        # Suppress the neighbourhood of this peak so the next candidate is a different one
+        x, y = coarse_loc
+        result[max(y - small_height // 2, 0):y + small_height // 2 + 1,
+               max(x - small_width // 2, 0):x + small_width // 2 + 1] = -1
+
+        area = clip((x * scale - pad, y * scale - pad, width + 2 * pad, height + 2 * pad), frame.shape[1], frame.shape[0])
+        if area is None or area[2] < width or area[3] < height:
+            continue
+        max_val, max_loc = best_match(crop(frame, area), template)
+        if max_val > best_val:
+            best_val, best_loc = max_val, (max_loc[0] + area[0], max_loc[1] + area[1])
+
+    if best_loc is None:
+        return None, peak_val
+    if best_val < confidence:
+        return None, best_val
+    return (best_loc[0], best_loc[1], width, height), best_val
+
+
+# The matching engines `Core` can be configured with, by name
+ENGINES = {
+    "exhaustive": locate,
+    "pyramid": locate_pyramid,
+}
+
+
+def locate_in_areas(
+    frame: np.ndarray,
+    needle: np.ndarray | Pyramid,
+    areas: list[tuple[int, int, int, int]],
+    confidence: float = 0.9,
+    engine: str = "exhaustive",
+    pyramids: dict | None = None
+) -> tuple[tuple[int, int, int, int] | None, int | None, float]:
+    """
+    Searches a list of areas of a frame in order and stops at the first one that contains the template.
+
+    Args:
+        frame (numpy.ndarray): The frame to search in.
+        needle (numpy.ndarray | Pyramid): The template to search for.
+        areas (list[tuple[int, int, int, int]]): The (left, top, width, height) areas to search, already clipped
+                                                 to the frame.
+        confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+        engine (str, optional): The name of the matching engine in `ENGINES`. Defaults to "exhaustive".
+        pyramids (dict | None, optional): A cache of the downscaled areas, shared by the templates searched in
+                                          the same frame. Defaults to None.
+
+    Returns:
+        tuple[tuple[int, int, int, int] | None, int | None, float]: The box of the match in frame coordinates,
+                                                                    the index of the area it was found in and
+                                                                    its score, or (None, None, best score)
+                                                                    when no area contains the template.
+    """
+    best_score = -1.0
+    for index, area in enumerate(areas):
+        haystack = pyramids.get(area) if pyramids is not None else None
+        if haystack is None:
+            haystack = Pyramid(crop(frame, area))
+            if pyramids is not None:
+                pyramids[area] = haystack
+        box, score = ENGINES[engine](haystack, needle, confidence)
+        if box is not None:
+            return (box[0] + area[0], box[1] + area[1], box[2], box[3]), index, score
+        best_score = max(best_score, score)
+    return None, None, best_score
+
+
+def center(box: tuple[int, int, int, int]) -> tuple[int, int]:
+    """
+    Returns the center point of a (left, top, width, height) box, rounded the same way as `pyautogui.center`.
+
+    Args:
+        box (tuple[int, int, int, int]): The box to compute the center of.
+
+    Returns:
+        tuple[int, int]: The (x, y) center point.
+    """
+    left, top, width, height = box
+    return left + int(width / 2), top + int(height / 2)
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """
+    Converts a BGR frame to a single channel frame. Frames that are already single channel are returned as is.
+
+    Args:
+        frame (numpy.ndarray): The frame to convert.
+
+    Returns:
+        numpy.ndarray: The grayscale frame.
+    """
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
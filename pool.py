@@ -0,0 +1,221 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from threading import Lock
+from typing import Hashable
+
+import numpy as np
+
+from matching import Pyramid, best_match, locate_in_areas
+
+# Shared memory blocks attached by a worker process, by name. Only the newest block is kept open
+_attached = {}
+
+
+def _attach(name: str) -> SharedMemory:
+    shm = _attached.get(name)
+    if shm is None:
+        for stale in _attached.values():
+            stale.close()
+        _attached.clear()
+        shm = _attached[name] = SharedMemory(name=name)
+    return shm
+
+
+def _locate_shared(name: str, shape: tuple, dtype: str, needle: np.ndarray, areas: list, confidence: float, engine: str):
+    frame = np.ndarray(shape, dtype=dtype, buffer=_attach(name).buf)
+    try:
+        return locate_in_areas(frame, needle, areas, confidence, engine)
+    finally:
+        # The view must be released before the block can be closed
+        del frame
+
+
+def _best_in_band(frame: np.ndarray, needle: np.ndarray, band: tuple[int, int]) -> tuple[float, tuple[int, int]]:
+    return best_match(frame[band[0]:band[1]], needle)
+
+
+def _best_in_shared_band(name: str, shape: tuple, dtype: str, needle: np.ndarray, band: tuple[int, int]):
+    frame = np.ndarray(shape, dtype=dtype, buffer=_attach(name).buf)
+    try:
+        return _best_in_band(frame, needle, band)
+    finally:
+        del frame
+
+
+class MatcherPool:
+    """
+    Matches templates on several cores at once.
+
+    With the "thread" backend the workers share the frame directly; OpenCV releases the GIL while matching,
+    so threads scale across cores. With the "process" backend the frame is copied once into a shared memory
+    block that every worker maps, instead of being pickled for each template. Either way each template is
+    matched with the same engine and areas as the serial path, so the results are identical.
+
+    Attributes:
+        backend (str): "thread" or "process".
+        workers (int): The number of workers.
+
+    Example:
+        >>> with MatcherPool(workers=4, backend="process") as pool:
+        ...     core = Core(matcher=pool)
+    """
+
+    def __init__(self, workers: int | None = None, backend: str = "thread"):
+        self.workers = workers or cpu_count() or 1
+        self.backend = backend
+        if backend == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="matcher")
+        elif backend == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            raise ValueError(f"Unknown matcher backend '{backend}', expected 'thread' or 'process'")
+        self._shm = None
+        self._lock = Lock()
+
+    def __enter__(self) -> "MatcherPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the workers and frees the shared memory block.
+        """
+        self._executor.shutdown()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _share(self, frame: np.ndarray) -> tuple[str, tuple, str]:
+        # The block is reused while frames fit in it, so the steady state costs one copy per frame
+        if self._shm is None or self._shm.size < frame.nbytes:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+            self._shm = SharedMemory(create=True, size=frame.nbytes)
+        shared = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf)
+        shared[...] = frame
+        del shared
+        return self._shm.name, frame.shape, frame.dtype.str
+
+    def locate_all(
+        self,
+        frame: np.ndarray,
+        needles: dict[Hashable, tuple],
+        confidence: float = 0.9,
+        engine: str = "exhaustive",
+        tracer=None
+    ) -> dict[Hashable, tuple]:
+        """
+        Matches several templates against a frame, one template per task.
+
+        With an enabled `tracer`, every template is recorded as its own "match" span, ended with its result as
+        soon as its task finishes. The span starts when the task is submitted, so it includes the time the task
+        waited for a free worker, and it is recorded in the calling thread.
+
+        Args:
+            frame (numpy.ndarray): The frame to search in.
+            needles (dict[Hashable, tuple]): The (template, areas) to search for each name, as taken by
+                                             `matching.locate_in_areas`.
+            confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+            engine (str, optional): The name of the matching engine. Defaults to "exhaustive".
+            tracer (Tracer | NullTracer | None, optional): Records a span per template. Defaults to None.
+
+        Returns:
+            dict[Hashable, tuple]: The (box, area index, score) of each template, as returned by
+                                   `locate_in_areas`.
+        """
+        spans = self._open_spans(needles, confidence, engine, tracer)
+        if self.backend == "thread":
+            futures = {
+                name: self._executor.submit(locate_in_areas, frame, needle, areas, confidence, engine)
+                for name, (needle, areas) in needles.items()
+            }
+            return self._collect(futures, spans)
+
+        with self._lock:
+            shared = self._share(frame)
+            futures = {
+                name: self._executor.submit(
+                    _locate_shared, *shared, needle.base if isinstance(needle, Pyramid) else needle,
+                    areas, confidence, engine
+                )
+                for name, (needle, areas) in needles.items()
+            }
+            return self._collect(futures, spans)
+
+    def _open_spans(self, needles: dict, confidence: float, engine: str, tracer) -> dict:
+        if tracer is None or not tracer.enabled:
+            return {}
+        return {
+            name: tracer.span("match", template=str(name), engine=engine, confidence=confidence, areas=len(areas),
+                              pool=self.backend).__enter__()
+            for name, (_, areas) in needles.items()
+        }
+
+    def _collect(self, futures: dict, spans: dict) -> dict[Hashable, tuple]:
+        if not spans:
+            return {name: future.result() for name, future in futures.items()}
+        names = {future: name for name, future in futures.items()}
+        results = {}
+        for future in as_completed(names):
+            span = spans[names[future]]
+            try:
+                box, index, score = results[names[future]] = future.result()
+            except BaseException as error:
+                span.__exit__(type(error), error, error.__traceback__)
+                raise
+            span.set(found=box is not None, area=index, score=score)
+            span.__exit__(None, None, None)
+        return {name: results[name] for name in futures}
+
+    def locate_tiled(
+        self,
+        frame: np.ndarray,
+        needle: np.ndarray,
+        confidence: float = 0.9,
+        tiles: int | None = None
+    ) -> tuple[int, int, int, int] | None:
+        """
+        Matches one large template by splitting the frame into horizontal bands, one band per task.
+
+        The bands overlap by the template height minus one row, so every position is scored by exactly one
+        band and the best score is the same as the exhaustive search over the whole frame.
+
+        Args:
+            frame (numpy.ndarray): The frame to search in.
+            needle (numpy.ndarray): The template to search for.
+            confidence (float, optional): The minimum correlation score for a match. Defaults to 0.9.
+            tiles (int | None, optional): The number of bands. Defaults to None, which uses one band per worker.
+
+        Returns:
+            tuple[int, int, int, int] | None: The (left, top, width, height) box of the best match, or None.
+        """
+        height, width = needle.shape[:2]
+        positions = frame.shape[0] - height + 1
+        if positions <= 0 or width > frame.shape[1]:
+            return None
+        tiles = max(1, min(tiles or self.workers, positions))
+        step = -(-positions // tiles)
+        bands = [(start, min(start + step, positions) + height - 1) for start in range(0, positions, step)]
+
+        if self.backend == "thread":
+            futures = [self._executor.submit(_best_in_band, frame, needle, band) for band in bands]
+            scores = [future.result() for future in futures]
+        else:
+            with self._lock:
+                shared = self._share(frame)
+                futures = [self._executor.submit(_best_in_shared_band, *shared, needle, band) for band in bands]
+                scores = [future.result() for future in futures]
+
+        # Ties go to the topmost band, the same position the exhaustive search reports
+        best_val, best_loc, best_band = -1.0, None, None
+        for band, (max_val, max_loc) in zip(bands, scores):
+            if max_val > best_val:
+                best_val, best_loc, best_band = max_val, max_loc, band
+        if best_val < confidence:
+            return None
+        return best_loc[0], best_loc[1] + best_band[0], width, height
@@ -0,0 +1,125 @@
+from threading import Lock
+from typing import Hashable
+
+import numpy as np
+
+# A (left, top, width, height) rectangle in screen coordinates, the same layout `pyautogui` uses for regions
+Region = tuple[int, int, int, int]
+
+
+def clip(region: Region, width: int, height: int) -> Region | None:
+    """
+    Clips a region to the bounds of a frame.
+
+    Args:
+        region (Region): The region to clip.
+        width (int): The width of the frame.
+        height (int): The height of the frame.
+
+    Returns:
+        Region | None: The part of the region inside the frame, or None if they do not overlap.
+    """
+    left, top = max(region[0], 0), max(region[1], 0)
+    right, bottom = min(region[0] + region[2], width), min(region[1] + region[3], height)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def intersect(first: Region, second: Region) -> Region | None:
+    """
+    Returns the overlap of two regions, or None if they do not overlap.
+    """
+    left, top = max(first[0], second[0]), max(first[1], second[1])
+    right = min(first[0] + first[2], second[0] + second[2])
+    bottom = min(first[1] + first[3], second[1] + second[3])
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def crop(frame: np.ndarray, region: Region) -> np.ndarray:
+    """
+    Returns a view of the part of a frame covered by a region, without copying. The region must be clipped.
+    """
+    left, top, width, height = region
+    return frame[top:top + height, left:left + width]
+
+
+def expand(box: Region, margin: int) -> Region:
+    """
+    Grows a box by `margin` pixels on every side.
+    """
+    return box[0] - margin, box[1] - margin, box[2] + 2 * margin, box[3] + 2 * margin
+
+
+class LocationHints:
+    """
+    Remembers where each template was last found on the screen.
+
+    Most clicks land on the same button in the same place on every run, so searching a small box around the
+    last match first is usually enough. The box is the last match grown by a margin on every side, which is
+    the template size unless `margin` is given.
+
+    Attributes:
+        margin (int | None): The fixed margin (in pixels) around the last match, or None to use the template size.
+        hits (int): The number of lookups resolved inside the hint box.
+        misses (int): The number of lookups that had a hint but had to search a larger area.
+    """
+
+    def __init__(self, margin: int | None = None):
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self._boxes = {}
+        self._lock = Lock()
+
+    def __contains__(self, name: Hashable) -> bool:
+        return name in self._boxes
+
+    def region(self, name: Hashable) -> Region | None:
+        """
+        Returns the area to search first for a template, or None if it was never found.
+
+        Args:
+            name (Hashable): The key of the template.
+
+        Returns:
+            Region | None: The last match grown by the margin.
+        """
+        box = self._boxes.get(name)
+        if box is None:
+            return None
+        margin = self.margin if self.margin is not None else max(box[2], box[3])
+        return expand(box, margin)
+
+    def record(self, name: Hashable, box: Region) -> None:
+        """
+        Stores the box where a template was found.
+        """
+        with self._lock:
+            self._boxes[name] = box
+
+    def count(self, hit: bool) -> None:
+        """
+        Counts the outcome of a lookup that started from a hint.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def forget(self, name: Hashable) -> None:
+        """
+        Drops the hint of a template.
+        """
+        with self._lock:
+            self._boxes.pop(name, None)
+
+    def clear(self) -> None:
+        """
+        Drops every hint. The counters are kept.
+        """
+        with self._lock:
+            self._boxes.clear()
@@ -0,0 +1,326 @@
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, Iterable
+
+import numpy as np
+
+from backends import HeadlessBackend
+from core import Core
+
+
+class Job:
+    """
+    A workflow to run on one session, such as the login and click sequence of one account.
+
+    Attributes:
+        name (str): The name the job is reported under.
+        workflow (Callable): Called as `workflow(core, *args, **kwargs)` with the `Core` of the session.
+        status (str): "pending", "running", "done" or "failed".
+        attempts (int): The number of times the job was started.
+        result: The value returned by the workflow once it succeeded.
+        error (BaseException | None): The exception of the last failed attempt.
+        session (str | None): The name of the session of the last attempt.
+        duration (float): How long (in seconds) the last attempt took.
+    """
+
+    def __init__(self, workflow: Callable, *args, name: str | None = None, **kwargs):
+        self.name = name if name is not None else getattr(workflow, "__name__", "job")
+        self.workflow = workflow
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "pending"
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.session = None
+        self.duration = 0.0
+
+    def __repr__(self) -> str:
+        return f"Job(name={self.name!r}, status={self.status!r}, attempts={self.attempts})"
+
+
+class LocalSession:
+    """
+    A session that owns a `Core`, built by `factory` with its own backend and desktop.
+
+    Sessions are what the runner dispatches jobs to. Each one must drive its own desktop, such as a separate
+    remote desktop session or virtual machine reached through its backend: two sessions on the same desktop
+    would share the mouse, the keyboard and the focus. The core is built on first use and built again by
+    `reset`, which drops every cache, hint and window index of the previous one.
+
+    Args:
+        name (str): The name the session is reported under.
+        factory (Callable[[], Core]): Builds the core of the session.
+        health_check (Callable[[Core], bool] | None, optional): Returns whether the core can run jobs. Defaults
+            to None, which checks that a frame can be captured and the windows can be listed.
+
+    Attributes:
+        jobs (int): The number of jobs that succeeded on the session.
+        failures (int): The number of attempts that failed on the session.
+        resets (int): The number of times the core was built again.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Core], health_check: Callable[[Core], bool] | None = None):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.jobs = 0
+        self.failures = 0
+        self.resets = 0
+        self._core = None
+
+    @property
+    def core(self) -> Core:
+        if self._core is None:
+            self._core = self.factory()
+        return self._core
+
+    def healthy(self) -> bool:
+        """
+        Runs the health check, treating any exception as unhealthy.
+        """
+        try:
+            if self.health_check is not None:
+                return bool(self.health_check(self.core))
+            frame = self.core.backend.screen.grab()
+            if frame is None or not frame.size:
+                return False
+            self.core.windows.refresh(force=True)
+            return True
+        except Exception:
+            return False
+
+    def reset(self) -> None:
+        """
+        Closes the core and builds a new one on next use.
+        """
+        self.close()
+        self.resets += 1
+
+    def close(self) -> None:
+        """
+        Stops the capture service and the matcher pool of the core, if it has them.
+        """
+        core, self._core = self._core, None
+        if core is None:
+            return
+        if core.capture is not None:
+            core.capture.stop()
+        if core.matcher is not None:
+            core.matcher.close()
+
+
+class FakeSession(LocalSession):
+    """
+    A session with a headless core, for testing workflows and the runner without a desktop.
+
+    Args:
+        name (str): The name the session is reported under.
+        broken (bool, optional): Whether the health check fails. Defaults to False.
+        recovers (bool, optional): Whether `reset` repairs a broken session. Defaults to True.
+        **backend_args: Passed to `HeadlessBackend`, such as `frames` or `windows`.
+
+    Attributes:
+        broken (bool): Set it to True to make the next health check fail.
+    """
+
+    def __init__(self, name: str, broken: bool = False, recovers: bool = True, **backend_args):
+        super().__init__(name, lambda: Core(backend=HeadlessBackend(**backend_args)))
+        self.broken = broken
+        self.recovers = recovers
+
+    def healthy(self) -> bool:
+        return not self.broken and super().healthy()
+
+    def reset(self) -> None:
+        super().reset()
+        if self.recovers:
+            self.broken = False
+
+
+class JobRunner:
+    """
+    Runs workflow jobs on a pool of sessions at the same time, one job per session at a time.
+
+    Every session has a worker thread that takes the next job from a shared queue. A session is health checked
+    before its first job, after every failed attempt and at least every `health_interval` seconds; an unhealthy
+    session is reset once, and taken out of the pool if it is still unhealthy. A failed job goes back to the
+    queue until it was attempted `max_attempts` times, so it usually runs again on another session. A job
+    interrupted by a `BaseException` that is not an `Exception`, such as `KeyboardInterrupt`, fails without
+    another attempt and its session leaves the pool. Jobs left when every session is out of the pool fail.
+
+    Attributes:
+        sessions (list[LocalSession]): The sessions jobs are dispatched to.
+        max_attempts (int): How many times a job is attempted before it fails.
+        health_interval (float): The longest time (in seconds) between two health checks of a session.
+        retry_delay (float): How long (in seconds) a session waits before taking another job after a failure.
+
+    Example:
+        >>> runner = JobRunner([LocalSession(f"desktop{n}", make_core(n)) for n in range(4)])
+        >>> for account in accounts:
+        ...     runner.submit(Core.search_open_and_auth, "App", has_login=True, login_page="Login",
+        ...                   user=account.user, password=account.password, name=account.user)
+        >>> jobs = runner.run()
+        >>> runner.stats()["throughput"]
+    """
+
+    def __init__(
+        self,
+        sessions: Iterable[LocalSession],
+        max_attempts: int = 3,
+        health_interval: float = 30.0,
+        retry_delay: float = 0.0
+    ):
+        self.sessions = list(sessions)
+        if not self.sessions:
+            raise ValueError("At least one session is required.")
+        if max_attempts < 1:
+            raise ValueError("Jobs must be attempted at least once.")
+        self.max_attempts = max_attempts
+        self.health_interval = health_interval
+        self.retry_delay = retry_delay
+        self.jobs = []
+        self.retries = 0
+        self.removed = []
+        self._queue = Queue()
+        self._lock = Lock()
+        # Jobs submitted and neither done nor failed yet, requeued ones included
+        self._remaining = 0
+        self._started = None
+        self._finished = None
+
+    def submit(self, workflow: Callable, *args, name: str | None = None, **kwargs) -> Job:
+        """
+        Adds a job to the queue. `workflow` is called as `workflow(core, *args, **kwargs)`.
+
+        Returns:
+            Job: The job, whose status and result are filled in by `run`.
+        """
+        job = Job(workflow, *args, name=name, **kwargs)
+        with self._lock:
+            self.jobs.append(job)
+            self._remaining += 1
+        self._queue.put(job)
+        return job
+
+    def _check(self, session: LocalSession) -> bool:
+        if session.healthy():
+            return True
+        session.reset()
+        return session.healthy()
+
+    def _settle(self, job: Job, status: str) -> None:
+        with self._lock:
+            job.status = status
+            self._remaining -= 1
+
+    def _work(self, session: LocalSession) -> None:
+        checked = None
+        while self._remaining:
+            if checked is None or monotonic() - checked >= self.health_interval:
+                if not self._check(session):
+                    with self._lock:
+                        self.removed.append(session.name)
+                    return
+                checked = monotonic()
+            try:
+                job = self._queue.get(timeout=0.05)
+            except Empty:
+                continue
+            job.status = "running"
+            job.attempts += 1
+            job.session = session.name
+            start = monotonic()
+            try:
+                job.result = job.workflow(session.core, *job.args, **job.kwargs)
+            except BaseException as error:
+                job.duration = monotonic() - start
+                job.error = error
+                session.failures += 1
+                # An interrupt or exit is not retried and stops the worker, which takes the session out of the pool
+                if isinstance(error, Exception) and job.attempts < self.max_attempts:
+                    job.status = "pending"
+                    with self._lock:
+                        self.retries += 1
+                    self._queue.put(job)
+                else:
+                    self._settle(job, "failed")
+                if not isinstance(error, Exception):
+                    with self._lock:
+                        self.removed.append(session.name)
+                    raise
+            else:
+                job.duration = monotonic() - start
+                job.error = None
+                self._settle(job, "done")
+                session.jobs += 1
+                continue
+            finally:
+                self._queue.task_done()
+            # The failure may have left the desktop in an unknown state
+            checked = None
+            sleep(self.retry_delay)
+
+    def run(self) -> list[Job]:
+        """
+        Runs every queued job and returns all the submitted jobs once they are done or failed.
+        """
+        self._started = monotonic()
+        workers = [Thread(target=self._work, args=(session,), name=f"session-{session.name}", daemon=True)
+                   for session in self.sessions]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Every session left the pool before the queue was empty
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except Empty:
+                break
+            job.error = RuntimeError("No healthy session left to run the job")
+            self._settle(job, "failed")
+            self._queue.task_done()
+        self._finished = monotonic()
+        return list(self.jobs)
+
+    def close(self) -> None:
+        """
+        Closes the cores of every session.
+        """
+        for session in self.sessions:
+            session.close()
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the last run.
+
+        Returns:
+            dict: The number of jobs done and failed, the retries, the sessions taken out of the pool, the
+                  elapsed time (in seconds), the throughput (in jobs done per second), the 50th and 90th
+                  percentile job durations (in seconds) and the jobs done, failures and resets per session.
+        """
+        with self._lock:
+            jobs = list(self.jobs)
+            removed = list(self.removed)
+        done = [job for job in jobs if job.status == "done"]
+        elapsed = 0.0
+        if self._started is not None:
+            elapsed = (self._finished if self._finished is not None else monotonic()) - self._started
+        durations = [job.duration for job in done]
+        p50, p90 = np.percentile(durations, (50, 90)) if durations else (0.0, 0.0)
+        return {
+            "done": len(done),
+            "failed": sum(job.status == "failed" for job in jobs),
+            "retries": self.retries,
+            "removed": removed,
+            "elapsed": elapsed,
+            "throughput": len(done) / elapsed if elapsed > 0 else 0.0,
+            "p50_duration": float(p50),
+            "p90_duration": float(p90),
+            "sessions": {
+                session.name: {"jobs": session.jobs, "failures": session.failures, "resets": session.resets}
+                for session in self.sessions
+            },
+        }
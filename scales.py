@@ -0,0 +1,108 @@
+import json
+from os import fdopen, remove, replace
+from os.path import abspath, dirname, exists
+from platform import node
+from tempfile import mkstemp
+from threading import RLock
+
+# The display scale factors of the fleet: 100%, 125% and 150%
+DEFAULT_SCALES = (1.0, 1.25, 1.5)
+
+
+class ScaleMemory:
+    """
+    Remembers, per host, the display scale at which templates were last found.
+
+    The scale the operating system reports is not always the one the images on the screen were drawn at, for
+    example in remote sessions or with applications that are not DPI aware. The scale that actually matched
+    is tried first on the next lookup. With a `path`, the memory is kept in a JSON file shared by every host,
+    so each machine starts with the scale it settled on in previous runs.
+
+    Attributes:
+        path (str | None): The JSON file the scales are stored in, or None to keep them in memory only.
+        host (str): The name this host is stored under.
+    """
+
+    def __init__(self, path: str | None = None, host: str | None = None):
+        self.path = path
+        self.host = host or node()
+        self._scales = {}
+        self._lock = RLock()
+        self.load()
+
+    def _read(self) -> dict:
+        if self.path is None or not exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                scales = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(scales, dict):
+            return {}
+        return {host: scale for host, scale in scales.items() if isinstance(scale, (int, float))}
+
+    def load(self) -> None:
+        """
+        Reads the scales from the file. A missing or unreadable file leaves the memory empty.
+        """
+        scales = self._read()
+        with self._lock:
+            self._scales = scales
+
+    def save(self) -> None:
+        """
+        Writes the scale of this host to the file, replacing it atomically.
+
+        The file is read again right before writing and only the entry of this host is replaced, so the scales
+        other hosts saved since this one started are kept. Every write goes through its own temporary file.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            scales = self._read()
+            if self.host in self._scales:
+                scales[self.host] = self._scales[self.host]
+            self._scales = scales
+            descriptor, temporary = mkstemp(prefix=".scales-", suffix=".tmp", dir=dirname(abspath(self.path)))
+            try:
+                with fdopen(descriptor, "w", encoding="utf-8") as file:
+                    json.dump(scales, file)
+                replace(temporary, self.path)
+            except BaseException:
+                remove(temporary)
+                raise
+
+    def get(self) -> float | None:
+        """
+        Returns the scale that last won on this host, or None.
+        """
+        return self._scales.get(self.host)
+
+    def record(self, scale: float) -> None:
+        """
+        Stores the scale a template was found at. The file is only written when the scale changes.
+        """
+        with self._lock:
+            if self._scales.get(self.host) == scale:
+                return
+            self._scales[self.host] = scale
+            self.save()
+
+    def order(self, detected: float, scales: tuple[float, ...]) -> list[float]:
+        """
+        Returns the scales to try: the remembered one, then the detected one, then the others from the closest
+        to the detected scale.
+
+        Args:
+            detected (float): The scale reported for the current display.
+            scales (tuple[float, ...]): The configured scales.
+
+        Returns:
+            list[float]: The scales in the order to try them, without duplicates.
+        """
+        ordered = []
+        for scale in (self.get(), detected, *sorted(scales, key=lambda scale: abs(scale - detected))):
+            if scale is not None and scale in scales and scale not in ordered:
+                ordered.append(scale)
+        return ordered
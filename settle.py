@@ -0,0 +1,81 @@
+from time import monotonic, sleep
+from typing import Callable, ContextManager
+
+import numpy as np
+
+from regions import Region, clip, crop
+
+
+class Settler:
+    """
+    Waits until an area of the screen stops changing, as a replacement for fixed sleeps between actions.
+
+    The area is captured every `interval` seconds and the wait ends as soon as it stays identical for `quiet`
+    seconds, or as soon as a postcondition is met, whichever comes first. It never lasts longer than `timeout`.
+
+    Attributes:
+        quiet (float): How long (in seconds) the area must stay unchanged to be considered settled.
+        timeout (float): The hard upper bound (in seconds) of every wait.
+        interval (float): The time (in seconds) between two captures.
+        settled (int): The number of waits that ended because the area settled or the postcondition was met.
+        timeouts (int): The number of waits that reached `timeout`.
+
+    Example:
+        >>> core = Core(settler=Settler(quiet=0.1, timeout=1.5))
+    """
+
+    def __init__(self, quiet: float = 0.15, timeout: float = 2.0, interval: float = 0.03):
+        if quiet > timeout:
+            raise ValueError("The quiet period cannot be longer than the timeout.")
+        self.quiet = quiet
+        self.timeout = timeout
+        self.interval = interval
+        self.settled = 0
+        self.timeouts = 0
+
+    def wait(
+        self,
+        frame: Callable[[], ContextManager[np.ndarray]],
+        region: Region | None = None,
+        postcondition: Callable[[np.ndarray], bool] | None = None
+    ) -> bool:
+        """
+        Waits until `region` stops changing or `postcondition` is met.
+
+        Args:
+            frame (Callable[[], ContextManager[numpy.ndarray]]): Returns a context manager that yields the current
+                                                                 screen, such as `Core._frame`.
+            region (Region | None, optional): The (left, top, width, height) area to watch. Defaults to None,
+                                              which watches the whole screen.
+            postcondition (Callable[[numpy.ndarray], bool] | None, optional): Checked on every frame that differs
+                                                                               from the previous one; the wait
+                                                                               ends when it returns True.
+                                                                               Defaults to None.
+
+        Returns:
+            bool: True if the area settled or the postcondition was met, False if the timeout was reached.
+        """
+        end_time = monotonic() + self.timeout
+        previous = None
+        stable_since = monotonic()
+        while True:
+            with frame() as current:
+                area = clip(region, current.shape[1], current.shape[0]) if region is not None else None
+                patch = crop(current, area) if area is not None else current
+                changed = previous is None or patch.shape != previous.shape or not np.array_equal(patch, previous)
+                if changed:
+                    previous = patch.copy()
+                    met = postcondition is not None and postcondition(current)
+            now = monotonic()
+            if changed:
+                if met:
+                    self.settled += 1
+                    return True
+                stable_since = now
+            elif now - stable_since >= self.quiet:
+                self.settled += 1
+                return True
+            if now >= end_time:
+                self.timeouts += 1
+                return False
+            sleep(min(self.interval, end_time - now))
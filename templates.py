@@ -0,0 +1,324 @@
+from collections import OrderedDict
+from os.path import abspath, normcase
+from threading import RLock
+from typing import Callable, Hashable, Iterable
+
+import cv2
+import numpy as np
+
+from matching import Pyramid, pyramid_level
+
+
+class Template:
+    """
+    A decoded template image held in memory.
+
+    Arrays derived from the decoded image, such as the grayscale version or the pyramid levels, are computed
+    on first access and kept with the template.
+
+    Attributes:
+        path (str): The normalized path of the file the template was decoded from.
+        color (numpy.ndarray): The template in BGR order, as returned by OpenCV.
+        gray (numpy.ndarray): The single channel version of the template.
+        nbytes (int): The number of bytes currently held by the template arrays.
+        on_grow (Callable[[], None] | None): Called after a derived value is added to the template or to one of
+                                             its resized versions, so a cache can enforce its byte budget.
+    """
+
+    __slots__ = ("path", "color", "on_grow", "_derived")
+
+    def __init__(self, path: str, color: np.ndarray, on_grow: Callable[[], None] | None = None):
+        self.path = path
+        self.color = color
+        self.on_grow = on_grow
+        self._derived = {}
+
+    def derived(self, name: Hashable, factory: Callable[["Template"], object]) -> object:
+        """
+        Returns an array derived from the template, computing it with `factory` on first access.
+
+        Args:
+            name (Hashable): The name the derived value is stored under.
+            factory (Callable[[Template], object]): Builds the value from the template.
+
+        Returns:
+            object: The derived value.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            value = self._derived[name] = factory(self)
+            if self.on_grow is not None:
+                self.on_grow()
+        return value
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.derived("gray", lambda template: cv2.cvtColor(template.color, cv2.COLOR_BGR2GRAY))
+
+    def image(self, grayscale: bool = False) -> np.ndarray:
+        """
+        Returns the BGR or the grayscale version of the template.
+        """
+        return self.gray if grayscale else self.color
+
+    def pyramid(self, grayscale: bool = False) -> Pyramid:
+        """
+        Returns the downscaled copies of the template used by the pyramid matching engine.
+        """
+        def build(template: "Template") -> Pyramid:
+            # The levels the engine searches are built up front, so they are counted as soon as the pyramid is added
+            image = template.image(grayscale)
+            pyramid = Pyramid(image)
+            pyramid.level(pyramid_level(image.shape))
+            return pyramid
+
+        return self.derived(("pyramid", grayscale), build)
+
+    def scaled(self, factor: float) -> "Template":
+        """
+        Returns the template resized by `factor`, for matching on a display with a different scale.
+
+        The resized template is computed once and kept with this one, along with its own grayscale version and
+        pyramid levels. A factor of 1 returns the template itself.
+
+        Args:
+            factor (float): The ratio between the scale of the display and the scale the image was captured at.
+
+        Returns:
+            Template: The resized template.
+        """
+        factor = round(factor, 4)
+        if factor == 1:
+            return self
+
+        def resize(template: "Template") -> "Template":
+            # Shrinking averages the pixels it merges, enlarging interpolates the edges of text and icons
+            interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+            color = cv2.resize(template.color, None, fx=factor, fy=factor, interpolation=interpolation)
+            return Template(f"{template.path}@{factor:g}x", color, template.on_grow)
+
+        return self.derived(("scaled", factor), resize)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.color.nbytes
+        for value in list(self._derived.values()):
+            total += value.nbytes
+        return total
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """
+        Returns the (width, height) of the template in pixels.
+        """
+        return self.color.shape[1], self.color.shape[0]
+
+
+class TemplateCache:
+    """
+    An in-memory LRU cache of decoded template images.
+
+    Templates are looked up by the keys of the `png` dictionary and decoded from disk only once. Entries are
+    stored by file path, so several keys that point to the same file (such as "r1" and "r1n") share a single
+    decoded array. When the total size of the cached arrays exceeds `max_bytes`, the least recently used
+    entries are evicted. The budget is checked again whenever a template gains a derived array, such as its
+    grayscale version, its pyramid or a resized version, so derived arrays count against it too.
+
+    Keys found in a template bundle (see `bundle.TemplateBundle`) are served from the memory-mapped bundle
+    instead of being decoded. Their pages belong to the operating system's file cache, so they are not counted
+    against `max_bytes` and never evicted.
+
+    Attributes:
+        resolver (Callable[[Hashable], str]): A callable that turns a dictionary key into an image file path.
+        max_bytes (int): The byte budget for all decoded arrays held by the cache.
+        bundle (TemplateBundle | None): The compiled bundle looked up before the image files.
+        hits (int): The number of lookups served from memory.
+        misses (int): The number of lookups that had to read and decode a file.
+        evictions (int): The number of entries dropped to stay within the byte budget.
+    """
+
+    def __init__(self, resolver: Callable[[Hashable], str], max_bytes: int = 256 * 1024 * 1024, bundle=None):
+        if max_bytes <= 0:
+            raise ValueError("Cache byte budget must be positive.")
+        self.resolver = resolver
+        self.max_bytes = max_bytes
+        self.bundle = bundle
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._paths = {}
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, dict_key: Hashable) -> bool:
+        if self.bundle is not None and dict_key in self.bundle:
+            return True
+        path = self._paths.get(dict_key)
+        return path is not None and path in self._entries
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return normcase(abspath(path))
+
+    @staticmethod
+    def decode(path: str) -> np.ndarray:
+        """
+        Reads and decodes an image file into a BGR array.
+
+        The file is read with numpy and decoded from memory so that paths containing non-ASCII characters
+        work on Windows, where `cv2.imread` cannot open them.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            numpy.ndarray: The decoded image in BGR order.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file cannot be decoded as an image.
+        """
+        data = np.fromfile(path, dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Cannot decode image file '{path}'")
+        return image
+
+    def template(self, dict_key: Hashable) -> Template:
+        """
+        Returns the decoded template for a dictionary key, reading it from disk on the first lookup.
+
+        Args:
+            dict_key (Hashable): The key used to look up the image file path.
+
+        Returns:
+            Template: The cached template.
+        """
+        if self.bundle is not None and dict_key in self.bundle:
+            with self._lock:
+                self.hits += 1
+                return self.bundle.template(dict_key)
+        with self._lock:
+            path = self._paths.get(dict_key)
+            if path is None:
+                path = self._normalize(self.resolver(dict_key))
+                self._paths[dict_key] = path
+        return self.template_from_file(path)
+
+    def template_from_file(self, path: str) -> Template:
+        """
+        Returns the decoded template for an image file path, reading it from disk on the first lookup.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            Template: The cached template.
+        """
+        path = self._normalize(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry
+            self.misses += 1
+            entry = Template(path, self.decode(path), lambda: self._grown(path))
+            self._entries[path] = entry
+            self._evict(keep=path)
+            return entry
+
+    def get(self, dict_key: Hashable, grayscale: bool = False) -> np.ndarray:
+        """
+        Returns the decoded image array for a dictionary key.
+
+        Args:
+            dict_key (Hashable): The key used to look up the image file path.
+            grayscale (bool, optional): Whether to return the single channel version. Defaults to False.
+
+        Returns:
+            numpy.ndarray: The template image, BGR or grayscale.
+        """
+        return self.template(dict_key).image(grayscale)
+
+    def get_file(self, path: str, grayscale: bool = False) -> np.ndarray:
+        """
+        Returns the decoded image array for an image file path.
+
+        Args:
+            path (str): The path to the image file.
+            grayscale (bool, optional): Whether to return the single channel version. Defaults to False.
+
+        Returns:
+            numpy.ndarray: The template image, BGR or grayscale.
+        """
+        return self.template_from_file(path).image(grayscale)
+
+    def preload(self, dict_keys: Iterable[Hashable], grayscale: bool = False, factors: Iterable[float] = ()) -> None:
+        """
+        Decodes the templates for the given keys ahead of time.
+
+        Args:
+            dict_keys (Iterable[Hashable]): The keys to load.
+            grayscale (bool, optional): Whether to also compute the grayscale versions. Defaults to False.
+            factors (Iterable[float], optional): The factors to compute resized versions for, as taken by
+                                                 `Template.scaled`. Defaults to ().
+        """
+        factors = tuple(factors)
+        for dict_key in dict_keys:
+            template = self.template(dict_key)
+            for factor in (1, *factors):
+                template.scaled(factor).image(grayscale)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Returns the number of bytes held by every cached template, including the derived arrays.
+        """
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def _grown(self, path: str) -> None:
+        # Derived arrays grow a template after it was inserted, such as the resized versions built by `preload`
+        with self._lock:
+            if path in self._entries:
+                self._evict(keep=path)
+
+    def _evict(self, keep: str) -> None:
+        # Derived arrays grow the templates after they are inserted, so the total is recomputed every time.
+        # The entry that was just used or grown is never evicted, even if it alone exceeds the budget
+        total = self.nbytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            path, entry = next(iter(self._entries.items()))
+            if path == keep:
+                self._entries.move_to_end(path)
+                continue
+            del self._entries[path]
+            total -= entry.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops every cached template. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict[str, int]: The hits, misses, evictions, number of entries and bytes held.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
@@ -0,0 +1,240 @@
+import json
+from bisect import bisect_left
+from collections import deque
+from os import getpid
+from threading import Lock, get_ident
+from time import perf_counter_ns
+
+# Upper bounds (in seconds) of the duration histogram buckets of the Prometheus snapshot
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Span:
+    """
+    A timed operation recorded by a `Tracer`, used as a context manager.
+
+    Attributes:
+        name (str): The kind of operation, such as "capture", "match" or "input".
+        attrs (dict): Details of the operation, such as the template name or the number of attempts.
+        start (int): The `time.perf_counter_ns` time the span started at.
+        duration (int): How long the span lasted, in nanoseconds.
+        thread (int): The id of the thread the span ran in.
+        error (str | None): The name of the exception that ended the span, or None.
+    """
+
+    __slots__ = ("tracer", "name", "attrs", "start", "duration", "thread", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = 0
+        self.duration = 0
+        self.thread = 0
+        self.error = None
+
+    def set(self, **attrs) -> None:
+        """
+        Adds details to the span, such as the result of the operation.
+        """
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.thread = get_ident()
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.duration = perf_counter_ns() - self.start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.tracer._record(self)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """
+    A tracer that records nothing, used when tracing is disabled.
+
+    Every span is the same shared object and counting does nothing, so instrumented code only pays for a
+    method call.
+    """
+
+    enabled = False
+
+    def span(self, name: str, **attrs) -> _NullSpan:
+        return _NULL_SPAN
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+
+class Tracer:
+    """
+    Records spans and counters in memory, for finding out where the time of a run went.
+
+    Spans are kept in a ring of `max_spans`, so a long run keeps its most recent operations; the duration
+    histograms and the counters cover the whole run. The spans can be exported as a Chrome trace, to be opened
+    in chrome://tracing or Perfetto, and the histograms and counters as a Prometheus text snapshot.
+
+    Attributes:
+        enabled (bool): Always True; `NullTracer.enabled` is False.
+        max_spans (int): The number of most recent spans kept.
+        dropped (int): The number of spans dropped from the ring.
+
+    Example:
+        >>> tracer = Tracer()
+        >>> core = Core(tracer=tracer)
+        >>> core.find_img_and_click("login")
+        >>> tracer.save_chrome_trace("run.json")
+        >>> print(tracer.prometheus())
+    """
+
+    enabled = True
+
+    def __init__(self, max_spans: int = 100000):
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans = deque(maxlen=max_spans)
+        self._histograms = {}
+        self._counters = {}
+        self._lock = Lock()
+
+    def span(self, name: str, **attrs) -> Span:
+        """
+        Returns a span to time an operation with a `with` block.
+
+        Args:
+            name (str): The kind of operation.
+            **attrs: Details of the operation, exported with the span.
+
+        Returns:
+            Span: The span, whose `set` method adds details while the operation runs.
+        """
+        return Span(self, name, attrs)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Adds `value` to the counter `name` with the given labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _record(self, span: Span) -> None:
+        seconds = span.duration / 1e9
+        with self._lock:
+            if len(self._spans) == self.max_spans:
+                self.dropped += 1
+            self._spans.append(span)
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = [[0] * (len(BUCKETS) + 1), 0.0, 0, 0]
+            histogram[0][bisect_left(BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            histogram[3] += span.error is not None
+
+    def spans(self, name: str | None = None) -> list[Span]:
+        """
+        Returns the recorded spans, oldest first, optionally only the ones with the given name.
+        """
+        with self._lock:
+            return [span for span in self._spans if name is None or span.name == name]
+
+    def clear(self) -> None:
+        """
+        Drops every span, histogram and counter.
+        """
+        with self._lock:
+            self._spans.clear()
+            self._histograms.clear()
+            self._counters.clear()
+            self.dropped = 0
+
+    def chrome_trace(self) -> dict:
+        """
+        Returns the spans in the Chrome trace event format, as complete ("X") events in microseconds.
+        """
+        pid = getpid()
+        events = []
+        for span in self.spans():
+            args = {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+                    for key, value in span.attrs.items()}
+            if span.error is not None:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": "core",
+                "ph": "X",
+                "ts": span.start / 1000,
+                "dur": span.duration / 1000,
+                "pid": pid,
+                "tid": span.thread,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path: str) -> None:
+        """
+        Writes `chrome_trace()` to a JSON file.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file)
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+    def prometheus(self, prefix: str = "core") -> str:
+        """
+        Returns the span duration histograms and the counters in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): The prefix of every metric name. Defaults to "core".
+
+        Returns:
+            str: The snapshot, with a `<prefix>_span_seconds` histogram and a `<prefix>_span_errors_total`
+                 counter labelled by span name, and a `<prefix>_<name>_total` counter for every counter.
+        """
+        with self._lock:
+            histograms = {name: (list(buckets), total, count, errors)
+                          for name, (buckets, total, count, errors) in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        if histograms:
+            lines.append(f"# TYPE {prefix}_span_seconds histogram")
+            for name, (buckets, total, count, _) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket in zip((*BUCKETS, "+Inf"), buckets):
+                    cumulative += bucket
+                    lines.append(f'{prefix}_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {total}')
+                lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {count}')
+            lines.append(f"# TYPE {prefix}_span_errors_total counter")
+            for name, (_, _, _, errors) in sorted(histograms.items()):
+                lines.append(f'{prefix}_span_errors_total{{span="{name}"}} {errors}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, labels), value in sorted(counters.items(), key=lambda item: str(item[0])):
+                if counter == name:
+                    lines.append(f"{prefix}_{name}_total{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,346 @@
+from threading import RLock
+from time import monotonic, sleep
+from typing import Iterable
+
+from changes import Backoff
+from regions import Region
+from tracing import NullTracer
+
+
+class WindowInfo:
+    """
+    A top-level window known to the registry.
+
+    Attributes:
+        handle (int): The native window handle.
+        title (str): The window title.
+        class_name (str): The window class name.
+        process_id (int): The id of the process that owns the window.
+        rect (Region | None): The (left, top, width, height) client area, used by providers that know it up front.
+    """
+
+    __slots__ = ("handle", "title", "class_name", "process_id", "rect")
+
+    def __init__(self, handle: int, title: str, class_name: str = "", process_id: int = 0, rect: Region | None = None):
+        self.handle = handle
+        self.title = title
+        self.class_name = class_name
+        self.process_id = process_id
+        self.rect = rect
+
+    def __repr__(self) -> str:
+        return f"WindowInfo(handle={self.handle}, title={self.title!r}, class_name={self.class_name!r}, process_id={self.process_id})"
+
+    def key(self) -> tuple:
+        return self.title, self.class_name, self.process_id
+
+
+class Win32WindowProvider:
+    """
+    Lists and focuses windows with the win32 API through `pywinauto`.
+
+    Window providers expose `windows()`, `active_handle()`, `title(handle)`, `focus(handle)`,
+    `client_rect(handle)` and `forget(handle)`. This one keeps a `pywinauto` connection per handle, so a
+    window is connected to once and then reused until it closes.
+    """
+
+    def __init__(self):
+        self._wrappers = {}
+
+    def windows(self) -> list[WindowInfo]:
+        """
+        Enumerates the visible top-level windows, the same set `pygetwindow.getAllTitles` and
+        `findwindows.find_windows` look at.
+        """
+        from pywinauto import findwindows
+
+        return [
+            WindowInfo(element.handle, element.name, element.class_name, element.process_id)
+            for element in findwindows.find_elements(top_level_only=True, visible_only=True)
+        ]
+
+    def active_handle(self) -> int | None:
+        from ctypes import windll
+
+        return windll.user32.GetForegroundWindow() or None
+
+    def title(self, handle: int) -> str:
+        from ctypes import create_unicode_buffer, windll
+
+        length = windll.user32.GetWindowTextLengthW(handle)
+        buffer = create_unicode_buffer(length + 1)
+        windll.user32.GetWindowTextW(handle, buffer, length + 1)
+        return buffer.value
+
+    def _wrapper(self, handle: int):
+        wrapper = self._wrappers.get(handle)
+        if wrapper is None:
+            from pywinauto import application
+
+            app = application.Application().connect(handle=handle)
+            wrapper = self._wrappers[handle] = app.window(handle=handle).wrapper_object()
+        return wrapper
+
+    def focus(self, handle: int) -> None:
+        self._wrapper(handle).set_focus()
+
+    def client_rect(self, handle: int) -> Region | None:
+        rect = self._wrapper(handle).client_area_rect()
+        return rect.left, rect.top, rect.width(), rect.height()
+
+    def forget(self, handle: int) -> None:
+        self._wrappers.pop(handle, None)
+
+
+class FakeWindowProvider:
+    """
+    An in-memory window provider, for running window logic without a desktop.
+
+    Attributes:
+        enumerations (int): The number of times `windows()` was called.
+        focused (list[int]): The handles passed to `focus`, in order.
+    """
+
+    def __init__(self, windows: Iterable[WindowInfo] = (), active: int | None = None):
+        self._windows = {window.handle: window for window in windows}
+        self._active = active
+        self.enumerations = 0
+        self.focused = []
+
+    def open(self, window: WindowInfo, activate: bool = False) -> None:
+        self._windows[window.handle] = window
+        if activate:
+            self._active = window.handle
+
+    def close(self, handle: int) -> None:
+        self._windows.pop(handle, None)
+        if self._active == handle:
+            self._active = None
+
+    def windows(self) -> list[WindowInfo]:
+        self.enumerations += 1
+        return [WindowInfo(w.handle, w.title, w.class_name, w.process_id, w.rect) for w in self._windows.values()]
+
+    def active_handle(self) -> int | None:
+        return self._active
+
+    def title(self, handle: int) -> str:
+        window = self._windows.get(handle)
+        return window.title if window is not None else ""
+
+    def focus(self, handle: int) -> None:
+        if handle not in self._windows:
+            raise ValueError(f"Window {handle} does not exist")
+        self.focused.append(handle)
+        self._active = handle
+
+    def client_rect(self, handle: int) -> Region | None:
+        window = self._windows.get(handle)
+        return window.rect if window is not None else None
+
+    def forget(self, handle: int) -> None:
+        pass
+
+
+class WindowRegistry:
+    """
+    An index of the open windows by title, class name and process, refreshed from a window provider.
+
+    Lookups are served from the index while it is younger than `max_age` seconds. A refresh enumerates the
+    windows once and only updates the index entries of windows that opened, closed or changed, releasing the
+    provider resources of closed windows. A lookup that finds nothing refreshes once more before giving up, so
+    windows that just opened are never missed.
+
+    Attributes:
+        provider: The window provider, such as `Win32WindowProvider` or `FakeWindowProvider`.
+        max_age (float): How long (in seconds) an enumeration is reused.
+        enumerations (int): The number of enumerations done by the registry.
+        tracer (Tracer | NullTracer): Records a span for every enumeration.
+    """
+
+    def __init__(self, provider, max_age: float = 0.5, tracer=None):
+        self.provider = provider
+        self.max_age = max_age
+        self.tracer = tracer if tracer is not None else NullTracer()
+        self.enumerations = 0
+        self._windows = {}
+        self._by_title = {}
+        self._by_class = {}
+        self._by_process = {}
+        self._refreshed = None
+        self._lock = RLock()
+
+    @staticmethod
+    def _add(index: dict, value, handle: int) -> None:
+        index.setdefault(value, set()).add(handle)
+
+    @staticmethod
+    def _remove(index: dict, value, handle: int) -> None:
+        handles = index.get(value)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del index[value]
+
+    def _index(self, window: WindowInfo) -> None:
+        self._add(self._by_title, window.title, window.handle)
+        self._add(self._by_class, window.class_name, window.handle)
+        self._add(self._by_process, window.process_id, window.handle)
+
+    def _unindex(self, window: WindowInfo) -> None:
+        self._remove(self._by_title, window.title, window.handle)
+        self._remove(self._by_class, window.class_name, window.handle)
+        self._remove(self._by_process, window.process_id, window.handle)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Enumerates the windows if the index is older than `max_age` seconds, or always if `force` is True.
+        """
+        with self._lock:
+            if not force and self._refreshed is not None and monotonic() - self._refreshed < self.max_age:
+                return
+            with self.tracer.span("window_enumeration") as span:
+                current = {window.handle: window for window in self.provider.windows()}
+                span.set(windows=len(current))
+            self.enumerations += 1
+            for handle in list(self._windows):
+                if handle not in current:
+                    self._unindex(self._windows.pop(handle))
+                    self.provider.forget(handle)
+            for handle, window in current.items():
+                known = self._windows.get(handle)
+                if known is not None and known.key() == window.key():
+                    continue
+                if known is not None:
+                    self._unindex(known)
+                self._windows[handle] = window
+                self._index(window)
+            self._refreshed = monotonic()
+
+    def invalidate(self) -> None:
+        """
+        Makes the next lookup enumerate the windows again.
+        """
+        self._refreshed = None
+
+    def _lookup(self, title: str | None, class_name: str | None, process_id: int | None) -> list[WindowInfo]:
+        handles = None
+        for index, value in ((self._by_title, title), (self._by_class, class_name), (self._by_process, process_id)):
+            if value is None:
+                continue
+            found = index.get(value, set())
+            handles = found if handles is None else handles & found
+        if handles is None:
+            handles = self._windows.keys()
+        return [self._windows[handle] for handle in handles]
+
+    def find(
+        self,
+        title: str | None = None,
+        class_name: str | None = None,
+        process_id: int | None = None
+    ) -> list[WindowInfo]:
+        """
+        Returns the windows matching every given attribute exactly.
+
+        Args:
+            title (str | None, optional): The window title. Defaults to None.
+            class_name (str | None, optional): The window class name. Defaults to None.
+            process_id (int | None, optional): The id of the owning process. Defaults to None.
+
+        Returns:
+            list[WindowInfo]: The matching windows.
+        """
+        with self._lock:
+            refreshed = self._refreshed
+            self.refresh()
+            windows = self._lookup(title, class_name, process_id)
+            # A stale index may miss a window that just opened
+            if not windows and refreshed == self._refreshed:
+                self.refresh(force=True)
+                windows = self._lookup(title, class_name, process_id)
+            return windows
+
+    def titles(self) -> list[str]:
+        """
+        Returns the titles of all the open windows.
+        """
+        with self._lock:
+            self.refresh()
+            return [window.title for window in self._windows.values()]
+
+    def active(self) -> WindowInfo | None:
+        """
+        Returns the window in the foreground with its current title, or None if there is none.
+        """
+        handle = self.provider.active_handle()
+        if handle is None:
+            return None
+        title = self.provider.title(handle)
+        with self._lock:
+            known = self._windows.get(handle)
+            if known is None:
+                return WindowInfo(handle, title)
+            if known.title != title:
+                self._unindex(known)
+                known.title = title
+                self._index(known)
+            return known
+
+    def active_title(self) -> str | None:
+        """
+        Returns the title of the window in the foreground, or None if there is none.
+        """
+        active = self.active()
+        return active.title if active is not None else None
+
+    def focus(self, handle: int) -> None:
+        """
+        Brings a window to the foreground, reusing the provider connection to it.
+        """
+        self.provider.focus(handle)
+
+    def client_rect(self, handle: int) -> Region | None:
+        """
+        Returns the (left, top, width, height) client area of a window in screen coordinates.
+        """
+        return self.provider.client_rect(handle)
+
+    def wait_until_active(
+        self,
+        title: str,
+        timeout: float = 20,
+        min_interval: float = 0.05,
+        max_interval: float = 0.5
+    ) -> bool:
+        """
+        Waits until the window in the foreground has the given title.
+
+        The foreground window is checked with a single native call per poll, and the interval between polls
+        doubles from `min_interval` up to `max_interval`, so the wait does not keep a core busy.
+
+        Args:
+            title (str): The title to wait for.
+            timeout (float, optional): The maximum amount of time (in seconds) to wait. Defaults to 20 seconds.
+            min_interval (float, optional): The first interval (in seconds) between polls. Defaults to 0.05 seconds.
+            max_interval (float, optional): The longest interval (in seconds) between polls. Defaults to 0.5 seconds.
+
+        Returns:
+            bool: True if the window became active, False if the timeout was reached.
+        """
+        backoff = Backoff(min_interval, max_interval)
+        end_time = monotonic() + timeout
+        while True:
+            if self.active_title() == title:
+                return True
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                return False
+            sleep(min(backoff.grow(), remaining))
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the number of enumerations and of indexed windows.
+        """
+        with self._lock:
+            return {"enumerations": self.enumerations, "windows": len(self._windows)}